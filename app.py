@@ -5,8 +5,11 @@ Simple Flask app to collect used car listings via POST endpoint.
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
 from store import Store
 from config import setup_logging
 from config_manager import ConfigManager
@@ -16,32 +19,63 @@ from routes.health import create_health_routes
 from routes.config import create_config_routes
 from schema_migrations import SchemaMigrator
 from pidlock import PidLock
+import json_utils
 
 # Setup logging
 logger = setup_logging()
 
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson (via json_utils) when installed, stdlib otherwise."""
+    
+    _COMPACT_ARGS = {'separators': (',', ':')}
+    
+    def dumps(self, obj, **kwargs):
+        # jsonify() always asks for compact separators, which is orjson's only output format;
+        # any other options (e.g. indent in debug mode) keep the stdlib behaviour
+        if json_utils.orjson is None or (kwargs and kwargs != self._COMPACT_ARGS):
+            return super().dumps(obj, **kwargs)
+        # Dates go through Flask's default so they keep its HTTP-date format
+        return json_utils.orjson.dumps(obj, default=self.default,
+                                       option=json_utils.orjson.OPT_PASSTHROUGH_DATETIME).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        if json_utils.orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return json_utils.orjson.loads(s)
+
+def wait_for_lock(pidlock, timeout):
+    """Wait up to timeout seconds for the lock holder to exit, then try to take the lock again."""
+    logger.info(f"⏳ Waiting up to {timeout:g}s for the running instance to exit...")
+    if not pidlock.wait_for_existing(timeout):
+        logger.info("🔒 Running instance did not exit in time")
+        return False
+    return pidlock.acquire()
+
 def run_preflight_checks():
     """Run pre-flight checks including PID lock and schema migrations."""
     logger.info("🔍 Running pre-flight checks...")
     
-    # Skip PID lock in Flask reloader process (debug mode creates parent/child processes)
-    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
-        logger.info("🔄 Flask reloader detected - skipping PID lock for parent process")
-    else:
-        # Check PID lock to prevent multiple instances
-        pidlock = PidLock()
-        if not pidlock.acquire():
-            # Another instance is running or PID conflict
-            exit(1)
+    pidlock = PidLock()
+    migrator = SchemaMigrator()
+    
+    # The PID lock and the schema version check are independent - run them side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        lock_future = executor.submit(pidlock.acquire)
+        check_future = executor.submit(migrator.check_migration_needed)
         
-        # Register signal handlers for graceful shutdown
-        pidlock.register_cleanup()
-        logger.info("🛡️ PID lock acquired and signal handlers registered")
+        # Check PID lock to prevent multiple instances (the reloader is disabled, so there is one process)
+        if not lock_future.result():
+            # Another instance is running or PID conflict - optionally give a restarting one time to exit
+            lock_wait = float(os.environ.get('GTI_LOCK_WAIT') or 0)
+            if not (lock_wait > 0 and wait_for_lock(pidlock, lock_wait)):
+                exit(1)
+        migration_needed, current_version, target_version = check_future.result()
     
-    # Check and run schema migrations if needed
-    migrator = SchemaMigrator()
-    migration_needed, current_version, target_version = migrator.check_migration_needed()
+    # Register signal handlers for graceful shutdown (must happen on the main thread)
+    pidlock.register_cleanup()
+    logger.info("🛡️ PID lock acquired and signal handlers registered")
     
+    # Run schema migrations if needed (only once the lock is held)
     if migration_needed:
         logger.info(f"📋 Schema migration needed: v{current_version} -> v{target_version}")
         success = migrator.run_preflight_migration()
@@ -56,10 +90,25 @@ def run_preflight_checks():
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)  # Enable CORS for all domains on all routes
 
-# Run pre-flight checks
-run_preflight_checks()
+# Responses are consumed by the extension, not diffed - skip per-response key sorting
+app.json.sort_keys = False
+
+# Let Werkzeug reject oversized request bodies before they reach the views
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024
+
+# Strip template-only whitespace at compile time so rendered pages are smaller
+app.jinja_env.trim_blocks = True
+app.jinja_env.lstrip_blocks = True
+
+# Persist compiled template code so restarts skip lexing/parsing unchanged templates
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(pattern='__gti_listings_jinja2_%s.cache')
+
+# Run pre-flight checks (already done by the Gunicorn master when served via gunicorn_conf.py)
+if os.environ.get('GTI_PREFLIGHT_DONE') != '1':
+    run_preflight_checks()
 
 # Initialize store and config manager
 store = Store()
@@ -72,5 +121,7 @@ create_health_routes(app)
 create_config_routes(app, config_manager)
 
 if __name__ == '__main__':
-    logger.info("Starting GTI Listings Flask app on port 5000")
-    app.run(debug=True, port=5000, host='127.0.0.1')
\ No newline at end of file
+    # Debugger only on request (FLASK_DEBUG=1); no reloader so the PID lock covers the serving process
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    logger.info(f"Starting GTI Listings Flask app on port 5000 (debug={debug})")
+    app.run(debug=debug, port=5000, host='127.0.0.1', use_reloader=False, threaded=True)
\ No newline at end of file
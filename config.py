@@ -3,16 +3,38 @@
 Configuration and logging setup for GTI Listings app.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
 
 def setup_logging():
-    """Configure logging for the application."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('app.log'),
-            logging.StreamHandler()
-        ]
-    )
-    return logging.getLogger(__name__)
\ No newline at end of file
+    """Configure logging for the application.
+    
+    Request threads only enqueue records; a background QueueListener owns the
+    file and console handlers so disk writes happen off the request path.
+    """
+    root = logging.getLogger()
+    
+    # Already configured (e.g. app imported twice) - keep the existing listener
+    if root.handlers:
+        return logging.getLogger(__name__)
+    
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler('app.log')
+    stream_handler = logging.StreamHandler()
+    file_handler.setFormatter(formatter)
+    stream_handler.setFormatter(formatter)
+    
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    # Drain queued records to disk before the interpreter exits
+    atexit.register(listener.stop)
+    
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    return logging.getLogger(__name__)
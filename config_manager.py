@@ -5,6 +5,7 @@ Handles storing and retrieving user configuration settings.
 """
 
 import json
+import json_utils
 import os
 from pathlib import Path
 import logging
@@ -18,14 +19,14 @@ class ConfigManager:
         """Initialize configuration manager."""
         self.config_file = Path(config_file)
         self.config = self._load_config()
+        self._snapshot = self.config.copy()
     
     def _load_config(self):
         """Load configuration from file."""
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
+                return json_utils.load_file(self.config_file)
+            except (json.JSONDecodeError, IOError) as e:  # Also covers orjson.JSONDecodeError
                 logger.error(f"Error loading config file: {e}")
                 return self._get_default_config()
         else:
@@ -46,8 +47,7 @@ class ConfigManager:
             config = self.config
         
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            json_utils.dump_file(config, self.config_file)
             logger.info(f"Configuration saved to {self.config_file}")
         except IOError as e:
             logger.error(f"Error saving config file: {e}")
@@ -60,13 +60,20 @@ class ConfigManager:
     def set(self, key, value):
         """Set a configuration value and save to file."""
         self.config[key] = value
+        self._snapshot = self.config.copy()
         self._save_config()
     
     def get_all(self):
-        """Get all configuration values."""
-        return self.config.copy()
+        """
+        Get all configuration values.
+        
+        Returns a snapshot shared between callers and rebuilt only when the
+        configuration changes - treat it as read-only.
+        """
+        return self._snapshot
     
     def update(self, updates):
         """Update multiple configuration values at once."""
         self.config.update(updates)
+        self._snapshot = self.config.copy()
         self._save_config()
\ No newline at end of file
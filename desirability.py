@@ -4,12 +4,118 @@ Desirability calculation module for GTI listings.
 Implements multi-criteria decision analysis for ranking cars by desirability.
 """
 
+import functools
+import heapq
 import logging
 import re
-from typing import List, Dict, Any, Optional
+from operator import itemgetter
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple
+
+from site_mappings import check_desirability_completeness
 
 logger = logging.getLogger(__name__)
 
+# Deletes currency and thousands separators in one pass: "$25,000" -> "25000"
+_STRIP_NUMBER_FORMATTING = str.maketrans('', '', '$,')
+
+# Shared read-only stand-in for a listing without a 'data' dict
+_EMPTY_DATA = MappingProxyType({})
+
+
+# Default weights (can be made configurable later)
+# DESIRABILITY_WEIGHTS = {
+#     'price': 0.4,      # Price is most important
+#     'mileage': 0.3,    # Mileage second most important
+#     'year': 0.2,       # Year moderately important
+#     'distance': 0.1    # Distance least important for now
+# }
+
+DESIRABILITY_WEIGHTS = {
+    'price': 0.4,      # Price is most important
+    'mileage': 0.25,    # Mileage second most important
+    'year': 0.35       # Year moderately important
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_formatted_int(text: str) -> Optional[int]:
+    """Parse "$25,000" / "45,000" style text to an int (memoized - listings share many values)."""
+    try:
+        return int(text.translate(_STRIP_NUMBER_FORMATTING))
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_plain_int(text: str) -> Optional[int]:
+    """Parse plain integer text like "2019" (memoized - listings share many values)."""
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def _parse_price(price_str: str) -> Optional[int]:
+    """Parse a price string like "$25,000" to an int, or None if unparseable."""
+    if not isinstance(price_str, str):
+        return None
+    return _parse_formatted_int(price_str)
+
+
+def _parse_mileage(mileage_str: str) -> Optional[int]:
+    """Parse a mileage string like "45,000" to an int, or None if unparseable."""
+    if not isinstance(mileage_str, str):
+        return None
+    return _parse_formatted_int(mileage_str)
+
+
+def _parse_year(year_str: str) -> Optional[int]:
+    """Parse a year string like "2019" to an int, or None if unparseable."""
+    if isinstance(year_str, str):
+        return _parse_plain_int(year_str)
+    try:
+        return int(year_str)
+    except (ValueError, TypeError):
+        return None
+
+
+def _value_range(values) -> Optional[Tuple[int, int]]:
+    """Return (min, max) of the parsed values, ignoring unparseable ones."""
+    numeric = [v for v in values if v is not None]
+    if not numeric:
+        return None
+    return min(numeric), max(numeric)
+
+
+def _scale(value: int, value_range: Optional[Tuple[int, int]], lower_is_better: bool) -> float:
+    """Rescale a value to 0-100 within its range (50 when the range is empty or flat)."""
+    if value_range is None:
+        return 50.0  # Default if no valid values
+
+    min_value, max_value = value_range
+    if max_value == min_value:
+        return 50.0  # All values same
+
+    if lower_is_better:
+        normalized = 100 * (max_value - value) / (max_value - min_value)
+    else:
+        normalized = 100 * (value - min_value) / (max_value - min_value)
+    return max(0, min(100, normalized))
+
+
+def _scale_column(values, value_range: Optional[Tuple[int, int]], lower_is_better: bool) -> List[Optional[float]]:
+    """Rescale a whole column of parsed values like _scale (unparseable values stay None)."""
+    if value_range is None or value_range[0] == value_range[1]:
+        return [None if v is None else 50.0 for v in values]
+
+    # Bind the range and its scale factor once: one multiply per value instead of a divide
+    min_value, max_value = value_range
+    scale = 100.0 / (max_value - min_value)
+    if lower_is_better:
+        return [None if v is None else max(0.0, min(100.0, (max_value - v) * scale)) for v in values]
+    return [None if v is None else max(0.0, min(100.0, (v - min_value) * scale)) for v in values]
+
 
 def normalize_price(price_str: str, all_prices: List[str]) -> float:
     """
@@ -22,35 +128,13 @@ def normalize_price(price_str: str, all_prices: List[str]) -> float:
     Returns:
         float: Score from 0-100 (higher = more desirable)
     """
-    try:
-        # Convert price string to numeric
-        price_numeric = int(price_str.replace('$', '').replace(',', ''))
-
-        # Get min/max from all prices
-        all_numeric = []
-        for p in all_prices:
-            try:
-                all_numeric.append(int(p.replace('$', '').replace(',', '')))
-            except (ValueError, AttributeError):
-                continue
-
-        if not all_numeric:
-            return 50.0  # Default if no valid prices
-
-        min_price = min(all_numeric)
-        max_price = max(all_numeric)
-
-        if max_price == min_price:
-            return 50.0  # All prices same
-
-        # Invert so lower price = higher score
-        normalized = 100 * (max_price - price_numeric) / (max_price - min_price)
-        return max(0, min(100, normalized))
-
-    except (ValueError, AttributeError) as e:
-        logger.warning(f"Could not normalize price '{price_str}': {e}")
+    price_numeric = _parse_price(price_str)
+    if price_numeric is None:
+        logger.warning(f"Could not normalize price '{price_str}'")
         return 50.0
 
+    return _scale(price_numeric, _value_range(map(_parse_price, all_prices)), lower_is_better=True)
+
 
 def normalize_mileage(mileage_str: str, all_mileages: List[str]) -> float:
     """
@@ -63,35 +147,13 @@ def normalize_mileage(mileage_str: str, all_mileages: List[str]) -> float:
     Returns:
         float: Score from 0-100 (higher = more desirable)
     """
-    try:
-        # Convert mileage string to numeric
-        mileage_numeric = int(mileage_str.replace(',', ''))
-
-        # Get min/max from all mileages
-        all_numeric = []
-        for m in all_mileages:
-            try:
-                all_numeric.append(int(m.replace(',', '')))
-            except (ValueError, AttributeError):
-                continue
-
-        if not all_numeric:
-            return 50.0  # Default if no valid mileages
-
-        min_mileage = min(all_numeric)
-        max_mileage = max(all_numeric)
-
-        if max_mileage == min_mileage:
-            return 50.0  # All mileages same
-
-        # Invert so lower mileage = higher score
-        normalized = 100 * (max_mileage - mileage_numeric) / (max_mileage - min_mileage)
-        return max(0, min(100, normalized))
-
-    except (ValueError, AttributeError) as e:
-        logger.warning(f"Could not normalize mileage '{mileage_str}': {e}")
+    mileage_numeric = _parse_mileage(mileage_str)
+    if mileage_numeric is None:
+        logger.warning(f"Could not normalize mileage '{mileage_str}'")
         return 50.0
 
+    return _scale(mileage_numeric, _value_range(map(_parse_mileage, all_mileages)), lower_is_better=True)
+
 
 def normalize_year(year_str: str, all_years: List[str]) -> float:
     """
@@ -104,35 +166,13 @@ def normalize_year(year_str: str, all_years: List[str]) -> float:
     Returns:
         float: Score from 0-100 (higher = more desirable)
     """
-    try:
-        # Convert year string to numeric
-        year_numeric = int(year_str)
-
-        # Get min/max from all years
-        all_numeric = []
-        for y in all_years:
-            try:
-                all_numeric.append(int(y))
-            except (ValueError, AttributeError):
-                continue
-
-        if not all_numeric:
-            return 50.0  # Default if no valid years
-
-        min_year = min(all_numeric)
-        max_year = max(all_numeric)
-
-        if max_year == min_year:
-            return 50.0  # All years same
-
-        # Higher year = higher score
-        normalized = 100 * (year_numeric - min_year) / (max_year - min_year)
-        return max(0, min(100, normalized))
-
-    except (ValueError, AttributeError) as e:
-        logger.warning(f"Could not normalize year '{year_str}': {e}")
+    year_numeric = _parse_year(year_str)
+    if year_numeric is None:
+        logger.warning(f"Could not normalize year '{year_str}'")
         return 50.0
 
+    return _scale(year_numeric, _value_range(map(_parse_year, all_years)), lower_is_better=False)
+
 
 # def normalize_distance(distance_str: Optional[str], all_distances: List[Optional[str]]) -> float:
 #     """
@@ -181,27 +221,44 @@ def normalize_year(year_str: str, all_years: List[str]) -> float:
 #         return 25.0  # Penalty for invalid distance
 
 
-def calculate_desirability_score(listing: Dict[str, Any], all_listings: List[Dict[str, Any]]) -> float:
-    """
-    Calculate overall desirability score for a listing using weighted normalization.
+# (price, mileage, year) scores when there is nothing to rank against
+NEUTRAL_FIELD_SCORES = (50.0, 50.0, 50.0)
 
-    Args:
-        listing: Individual listing dict with 'data' field
-        all_listings: List of all listings for normalization context
 
-    Returns:
-        float: Desirability score from 0-100 (higher = more desirable)
-    """
-    try:
-        data = listing.get('data', {})
+def _parse_fields(data: Dict[str, Any]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """Parse the (price, mileage, year) fields of a listing's data once."""
+    return (
+        _parse_price(data.get('price', '')),
+        _parse_mileage(data.get('mileage', '')),
+        _parse_year(data.get('year', ''))
+    )
+
+
+def _collect_ranges(parsed_rows: List[Tuple[Optional[int], Optional[int], Optional[int]]]) -> Dict[str, Any]:
+    """Compute the (min, max) normalization range of each field across all listings."""
+    prices, mileages, years = zip(*parsed_rows) if parsed_rows else ((), (), ())
+    # all_distances = [l.get('data', {}).get('distance') for l in all_listings]
+    return {
+        'price': _value_range(prices),
+        'mileage': _value_range(mileages),
+        'year': _value_range(years)
+    }
+
 
-        # Extract all values for normalization context
-        all_prices = [l.get('data', {}).get('price', '') for l in all_listings]
-        all_mileages = [l.get('data', {}).get('mileage', '') for l in all_listings]
-        all_years = [l.get('data', {}).get('year', '') for l in all_listings]
-        # all_distances = [l.get('data', {}).get('distance') for l in all_listings]
-        # logger.debug(f"All distances: {all_distances}")
+def _field_scores(parsed_rows: List[Tuple[Optional[int], Optional[int], Optional[int]]],
+                  ranges: Dict[str, Any]) -> List[Tuple[Optional[float], Optional[float], Optional[float]]]:
+    """Normalize parsed rows column by column into (price, mileage, year) scores."""
+    prices, mileages, years = zip(*parsed_rows)
+    return list(zip(
+        _scale_column(prices, ranges['price'], lower_is_better=True),
+        _scale_column(mileages, ranges['mileage'], lower_is_better=True),
+        _scale_column(years, ranges['year'], lower_is_better=False)
+    ))
 
+
+def _score_listing(data: Dict[str, Any], scores: Tuple[Optional[float], Optional[float], Optional[float]]) -> float:
+    """Combine one listing's normalized field scores (see calculate_desirability_score)."""
+    try:
         # Check for required fields - give zero score if any are missing
         # required_fields = ['price', 'year', 'mileage', 'distance']
 
@@ -212,45 +269,35 @@ def calculate_desirability_score(listing: Dict[str, Any], all_listings: List[Dic
             logger.warning(f"⚠️ Cannot calculate desirability for {data.get('vin', 'unknown')} - missing fields: {missing_fields}")
             return 0.0
 
-        # Calculate individual normalized scores
-        price_score = normalize_price(data.get('price', ''), all_prices)
-        mileage_score = normalize_mileage(data.get('mileage', ''), all_mileages)
-        year_score = normalize_year(data.get('year', ''), all_years)
+        price_score, mileage_score, year_score = scores
 
-        # distance_score = normalize_distance(data.get('distance', None), all_distances)
-        # logger.debug(f"Distance score for {data.get('vin', 'unknown')}: {distance_score}")
+        # Unparseable values score a neutral 50
+        if price_score is None:
+            logger.warning(f"Could not normalize price '{data.get('price')}'")
+            price_score = 50.0
 
-        # Default weights (can be made configurable later)
-        # weights = {
-        #     'price': 0.4,      # Price is most important
-        #     'mileage': 0.3,    # Mileage second most important
-        #     'year': 0.2,       # Year moderately important
-        #     'distance': 0.1    # Distance least important for now
-        # }
+        if mileage_score is None:
+            logger.warning(f"Could not normalize mileage '{data.get('mileage')}'")
+            mileage_score = 50.0
 
-        weights = {
-            'price': 0.4,      # Price is most important
-            'mileage': 0.25,    # Mileage second most important
-            'year': 0.35       # Year moderately important
-        }
+        if year_score is None:
+            logger.warning(f"Could not normalize year '{data.get('year')}'")
+            year_score = 50.0
+
+        # distance_score = normalize_distance(data.get('distance', None), all_distances)
+        # logger.debug(f"Distance score for {data.get('vin', 'unknown')}: {distance_score}")
 
         # Calculate weighted score
         total_score = (
-            price_score * weights['price'] +
-            mileage_score * weights['mileage'] +
-            year_score * weights['year']
-            # + distance_score * weights['distance']
+            price_score * DESIRABILITY_WEIGHTS['price'] +
+            mileage_score * DESIRABILITY_WEIGHTS['mileage'] +
+            year_score * DESIRABILITY_WEIGHTS['year']
+            # + distance_score * DESIRABILITY_WEIGHTS['distance']
         )
 
-        # logger.debug(f"Desirability for {data.get('vin', 'unknown')}: "
-        #             f"price={price_score:.1f}, mileage={mileage_score:.1f}, "
-        #             f"year={year_score:.1f}, distance={distance_score:.1f}, "
-        #             f"total={total_score:.1f}")
-
-        logger.debug(f"Desirability for {data.get('vin', 'unknown')}: "
-                    f"price={price_score:.1f}, mileage={mileage_score:.1f}, "
-                    f"year={year_score:.1f}, "
-                    f"total={total_score:.1f}")
+        # Lazy %-style args: nothing is formatted unless DEBUG logging is enabled
+        logger.debug("Desirability for %s: price=%.1f, mileage=%.1f, year=%.1f, total=%.1f",
+                     data.get('vin', 'unknown'), price_score, mileage_score, year_score, total_score)
 
         return round(total_score, 1)
 
@@ -259,12 +306,41 @@ def calculate_desirability_score(listing: Dict[str, Any], all_listings: List[Dic
         return 0.0
 
 
-def add_desirability_scores(listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def calculate_desirability_score(listing: Dict[str, Any], all_listings: List[Dict[str, Any]]) -> float:
+    """
+    Calculate overall desirability score for a listing using weighted normalization.
+
+    Scoring many listings this way re-parses all_listings for each call; use
+    add_desirability_scores to score a whole batch.
+
+    Args:
+        listing: Individual listing dict with 'data' field
+        all_listings: List of all listings for normalization context
+
+    Returns:
+        float: Desirability score from 0-100 (higher = more desirable)
+    """
+    try:
+        data = listing.get('data', _EMPTY_DATA)
+        ranges = _collect_ranges([_parse_fields(l.get('data', _EMPTY_DATA)) for l in all_listings])
+        return _score_listing(data, _field_scores([_parse_fields(data)], ranges)[0])
+
+    except Exception as e:
+        logger.error(f"Error calculating desirability for listing: {e}")
+        return 0.0
+
+
+def add_desirability_scores(listings: List[Dict[str, Any]], flag_incomplete: bool = False) -> List[Dict[str, Any]]:
     """
     Add desirability scores to all listings in place.
 
+    Each listing's fields are parsed once, the normalization ranges are
+    computed once, and each field is then normalized as a whole column.
+
     Args:
         listings: List of listing dicts
+        flag_incomplete: Also add a desirability_warning to listings missing
+            required fields, checked in the same pass that parses them
 
     Returns:
         List[Dict[str, Any]]: Same listings with desirability_score added to each
@@ -274,9 +350,49 @@ def add_desirability_scores(listings: List[Dict[str, Any]]) -> List[Dict[str, An
 
     logger.info(f"Calculating desirability scores for {len(listings)} listings")
 
+    parsed_rows = []
     for listing in listings:
-        score = calculate_desirability_score(listing, listings)
-        listing['desirability_score'] = score
+        data = listing.get('data', _EMPTY_DATA)
+        if flag_incomplete:
+            is_complete, missing_fields = check_desirability_completeness(data)
+            if not is_complete:
+                logger.warning(f"⚠️ Listing {listing.get('id', 'unknown')} missing desirability fields: {missing_fields}")
+                # Add warning flag for UI display
+                listing['desirability_warning'] = f"Missing: {', '.join(missing_fields)}"
+        parsed_rows.append(_parse_fields(data))
+    ranges = _collect_ranges(parsed_rows)
+
+    # With no spread in any field (e.g. a single listing) every field scores a neutral 50
+    if all(r is None or r[0] == r[1] for r in ranges.values()):
+        for listing in listings:
+            listing['desirability_score'] = _score_listing(listing.get('data', _EMPTY_DATA), NEUTRAL_FIELD_SCORES)
+        logger.info("Desirability score calculation complete (no spread in any field)")
+        return listings
+
+    field_scores = _field_scores(parsed_rows, ranges)
+
+    for listing, scores in zip(listings, field_scores):
+        listing['desirability_score'] = _score_listing(listing.get('data', _EMPTY_DATA), scores)
 
     logger.info("Desirability score calculation complete")
     return listings
+
+
+def rank_listings(listings: List[Dict[str, Any]], k: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Score listings and return them ordered from most to least desirable.
+
+    Args:
+        listings: List of listing dicts (scored in place like add_desirability_scores)
+        k: Only return the top k listings (all listings if None)
+
+    Returns:
+        List[Dict[str, Any]]: Listings sorted by desirability_score, highest first;
+        ties keep their input order
+    """
+    add_desirability_scores(listings)
+    by_score = itemgetter('desirability_score')
+    if k is None:
+        return sorted(listings, key=by_score, reverse=True)
+    # Partial selection - no need to order the listings that fall outside the top k
+    return heapq.nlargest(k, listings, key=by_score)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Gunicorn configuration for GTI Listings.
+
+Usage:
+    gunicorn -c gunicorn_conf.py wsgi:application
+
+Schema migrations run once in the master process before any worker is
+forked, so importing the app in a worker only builds routes.
+"""
+
+import os
+
+bind = '127.0.0.1:5000'
+
+# Store keeps the VIN index in process memory - scale with threads, not workers
+workers = 1
+worker_class = 'gthread'
+threads = 4
+
+
+def on_starting(server):
+    """Run schema migrations once before workers start."""
+    from schema_migrations import SchemaMigrator
+    
+    server.log.info("🔍 Running schema migration check before starting workers")
+    if not SchemaMigrator().run_preflight_migration():
+        # Gunicorn aborts startup when a master hook raises
+        raise RuntimeError("Schema migration failed")
+    
+    # Workers inherit the environment; tells app.py the migration already ran
+    os.environ['GTI_PREFLIGHT_DONE'] = '1'
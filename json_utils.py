@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+JSON file helpers for GTI Listings.
+Uses orjson when it is installed and falls back to the standard library otherwise.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional speedup - stdlib json produces the same files
+    orjson = None
+
+
+def loads(data):
+    """Parse JSON from str or UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, indent=True):
+    """Serialize obj to UTF-8 JSON bytes (2-space indented unless indent is False)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def load_file(path):
+    """Read and parse a JSON file."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(obj, path, indent=True):
+    """Serialize obj and write it to path as UTF-8 JSON."""
+    data = dumps(obj, indent)
+    with open(path, 'wb') as f:
+        f.write(data)
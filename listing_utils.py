@@ -8,6 +8,17 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Deletes currency and thousands separators in one pass: "$25,000" -> "25000"
+_STRIP_NUMBER_FORMATTING = str.maketrans('', '', '$,')
+
+# Fields to compare (excluding metadata and multi-site specific fields)
+COMPARABLE_FIELDS = frozenset((
+    'price', 'year', 'mileage', 'distance', 'vin', 'title', 'location',
+    'drivetrain', 'exterior_color', 'interior_color', 'mpg', 'engine', 'fuel_type', 'transmission',
+    'trim_level', 'car_title', 'accidents', 'previous_owners', 'phone_number',
+    'urls', 'sites_seen', 'last_updated_site'  # Multi-site fields
+))
+
 
 def compare_listing_data(existing_data, new_data):
     """
@@ -27,20 +38,14 @@ def compare_listing_data(existing_data, new_data):
     changes = {}
     updated_data = existing_data.copy()
     
-    # Fields to compare (excluding metadata and multi-site specific fields)
-    comparable_fields = [
-        'price', 'year', 'mileage', 'distance', 'vin', 'title', 'location',
-        'drivetrain', 'exterior_color', 'interior_color', 'mpg', 'engine', 'fuel_type', 'transmission',
-        'trim_level', 'car_title', 'accidents', 'previous_owners', 'phone_number',
-        'urls', 'sites_seen', 'last_updated_site'  # Multi-site fields
-    ]
-    
-    for field in comparable_fields:
-        existing_value = existing_data.get(field)
-        new_value = new_data.get(field)
-        
+    # Single pass over the submitted fields; absent fields cost nothing
+    for field, new_value in new_data.items():
         # Only update if new value exists and is different
-        if new_value is not None and existing_value != new_value:
+        if new_value is None or field not in COMPARABLE_FIELDS:
+            continue
+        
+        existing_value = existing_data.get(field)
+        if existing_value != new_value:
             changes[field] = {
                 'old': existing_value,
                 'new': new_value
@@ -57,6 +62,22 @@ def compare_listing_data(existing_data, new_data):
     }
 
 
+def parse_price(price_str):
+    """
+    Parse a display price like "$25,000" into whole dollars.
+    
+    Args:
+        price_str (str): Price string from listing data
+    
+    Returns:
+        int: Price in whole dollars, or 0 if the price cannot be parsed
+    """
+    try:
+        return int(price_str.translate(_STRIP_NUMBER_FORMATTING).split('.')[0])
+    except (ValueError, AttributeError):
+        return 0
+
+
 def merge_listing_data(existing_data, new_data):
     """
     Merge new listing data into existing data, preserving existing values
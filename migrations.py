@@ -4,24 +4,53 @@ Data migration framework for GTI Listings app.
 Provides repeatable, safe data structure evolution with backups and logging.
 """
 
-import json
+import atexit
+import gzip
 import logging
+import logging.handlers
 import tarfile
 import shutil
+import subprocess
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Callable, Optional
+from typing import Dict, Any, BinaryIO, List, Callable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional speedup - backups fall back to fast gzip
+    zstandard = None
+
+import json_utils
+from site_mappings import detect_site_from_url
 
 # Set up migration-specific logging
 migration_logger = logging.getLogger('migrations')
 migration_handler = logging.FileHandler('migrations.log')
 migration_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 migration_handler.setFormatter(migration_formatter)
-migration_logger.addHandler(migration_handler)
+# Buffer records and write them in bulk; errors still flush immediately
+migration_buffer = logging.handlers.MemoryHandler(10000, flushLevel=logging.ERROR, target=migration_handler)
+migration_logger.addHandler(migration_buffer)
+atexit.register(migration_buffer.flush)
 migration_logger.setLevel(logging.INFO)
 
+# Backups are taken before every migration; fast compression keeps them quick
+BACKUP_COMPRESSLEVEL = 1
+BACKUP_ZSTD_LEVEL = 3
+BACKUP_BUFSIZE = 1024 * 1024
+BACKUP_EXTENSIONS = ('.tar.zst', '.tar.gz')
+# Top-level directory every backup member lives under
+BACKUP_ARCHIVE_ROOT = "data"
+
+# Listing files are small, so reads are dominated by per-file latency; overlap them
+LISTING_LOAD_WORKERS = 32
+
+# Above this many listings JSON work dominates, so migrate across processes instead of threads
+PROCESS_POOL_THRESHOLD = 1000
+
 class MigrationError(Exception):
     """Custom exception for migration errors."""
     pass
@@ -49,21 +78,27 @@ class DataMigrator:
             Path to the created backup file
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"data_backup_{migration_name}_{timestamp}.tar.gz"
+        extension = '.tar.zst' if zstandard is not None else '.tar.gz'
+        backup_filename = f"data_backup_{migration_name}_{timestamp}{extension}"
         backup_path = self.backup_dir / backup_filename
         
         if not self.data_dir.exists():
             migration_logger.warning(f"⚠️ Data directory {self.data_dir} does not exist, creating empty backup")
             # Create empty backup
-            with tarfile.open(backup_path, "w:gz") as tar:
+            with open(backup_path, 'wb') as raw, \
+                    self._compressor(raw) as compressed, \
+                    tarfile.open(fileobj=compressed, mode='w|') as tar:
                 pass
             return backup_path
         
         migration_logger.info(f"📦 Creating backup: {backup_filename}")
         
         try:
-            with tarfile.open(backup_path, "w:gz") as tar:
-                tar.add(self.data_dir, arcname="data", recursive=True)
+            # Stream the archive through the compressor instead of buffering it in the tar layer
+            with open(backup_path, 'wb') as raw, \
+                    self._compressor(raw) as compressed, \
+                    tarfile.open(fileobj=compressed, mode='w|', bufsize=BACKUP_BUFSIZE) as tar:
+                self._add_tree(tar, self.data_dir, BACKUP_ARCHIVE_ROOT)
             
             backup_size = backup_path.stat().st_size / (1024 * 1024)  # MB
             migration_logger.info(f"✅ Backup created successfully: {backup_filename} ({backup_size:.2f} MB)")
@@ -74,6 +109,23 @@ class DataMigrator:
             migration_logger.error(f"❌ Failed to create backup: {e}")
             raise MigrationError(f"Backup creation failed: {e}")
     
+    def _compressor(self, raw: BinaryIO) -> BinaryIO:
+        """Wrap raw in a compressing writer: multi-threaded zstd when installed, fast gzip otherwise."""
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL, threads=-1).stream_writer(raw, closefd=False)
+        return gzip.GzipFile(filename='', fileobj=raw, mode='wb', compresslevel=BACKUP_COMPRESSLEVEL)
+    
+    def _add_tree(self, tar: tarfile.TarFile, path: Path, arcname: str) -> None:
+        """Add a directory and everything under it to tar, walking with os.scandir."""
+        tar.add(path, arcname=arcname, recursive=False)
+        with os.scandir(path) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                entry_arcname = f"{arcname}/{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    self._add_tree(tar, Path(entry.path), entry_arcname)
+                else:
+                    tar.add(entry.path, arcname=entry_arcname, recursive=False)
+    
     def restore_backup(self, backup_path: Path) -> bool:
         """
         Restore data from a backup file.
@@ -88,17 +140,50 @@ class DataMigrator:
             migration_logger.error(f"❌ Backup file not found: {backup_path}")
             return False
         
+        is_zstd = backup_path.name.endswith('.tar.zst')
+        external_command = self._external_decompress_command(is_zstd)
+        if is_zstd and zstandard is None and external_command is None:
+            migration_logger.error(f"❌ zstandard or the zstd tool is required to restore {backup_path.name}")
+            return False
+        
         migration_logger.info(f"🔄 Restoring backup: {backup_path.name}")
         
         try:
+            # Prefer multi-threaded pigz/zstd piped into tar when they are installed; tar has no
+            # equivalent of filter='data', so its members are checked before anything is removed
+            if external_command is not None and not self._check_with_external_tools(backup_path, external_command):
+                migration_logger.warning(f"⚠️ External decompression failed, falling back to Python")
+                external_command = None
+                if is_zstd and zstandard is None:
+                    raise MigrationError("zstandard is required for the Python fallback")
+            
             # Remove current data directory if it exists
             if self.data_dir.exists():
                 shutil.rmtree(self.data_dir)
                 migration_logger.info(f"🗑️ Removed existing data directory")
             
-            # Extract backup
-            with tarfile.open(backup_path, "r:gz") as tar:
-                tar.extractall(path=self.data_dir.parent, filter='data')
+            if external_command is not None:
+                if self._extract_with_external_tools(backup_path, external_command):
+                    migration_logger.info(f"✅ Backup restored successfully")
+                    return True
+                migration_logger.warning(f"⚠️ External extraction failed, retrying in Python")
+                if self.data_dir.exists():
+                    shutil.rmtree(self.data_dir)
+                if is_zstd and zstandard is None:
+                    raise MigrationError("zstandard is required for the Python fallback")
+            
+            # Portable (slower, single-threaded) path: stream members in archive order with large reads
+            with open(backup_path, 'rb') as raw:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                if is_zstd:
+                    source, mode = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False), "r|"
+                else:
+                    source, mode = raw, "r|gz"
+                with tarfile.open(fileobj=source, mode=mode, bufsize=BACKUP_BUFSIZE) as tar:
+                    for member in tar:
+                        self._check_backup_member(member)
+                        tar.extract(member, path=self.data_dir.parent, filter='data')
             
             migration_logger.info(f"✅ Backup restored successfully")
             return True
@@ -107,11 +192,94 @@ class DataMigrator:
             migration_logger.error(f"❌ Failed to restore backup: {e}")
             return False
     
+    def _external_decompress_command(self, is_zstd: bool) -> Optional[List[str]]:
+        """Return a multi-threaded decompress-to-stdout command for the backup type, if the tools exist."""
+        if shutil.which('tar') is None:
+            return None
+        if is_zstd:
+            tool = shutil.which('zstd')
+            return [tool, '-T0', '-dc'] if tool else None
+        tool = shutil.which('pigz')
+        return [tool, '-dc'] if tool else None
+    
+    def _check_backup_member(self, member: tarfile.TarInfo) -> None:
+        """
+        Reject a backup member that could write outside the restored data directory.
+        
+        Applies the same checks as extracting with filter='data' (no absolute or
+        escaping paths or links, no device files) and requires the member to live
+        under the backup's top-level data directory.
+        
+        Raises:
+            MigrationError: If the member is not safe to extract
+        """
+        def within_root(path: str) -> bool:
+            path = os.path.normpath(path)
+            return path == BACKUP_ARCHIVE_ROOT or path.startswith(BACKUP_ARCHIVE_ROOT + os.sep)
+        
+        if not within_root(member.name):
+            raise MigrationError(f"Backup member {member.name!r} is outside {BACKUP_ARCHIVE_ROOT}/")
+        if member.issym() and not within_root(os.path.join(os.path.dirname(member.name), member.linkname)):
+            raise MigrationError(f"Backup member {member.name!r} links outside {BACKUP_ARCHIVE_ROOT}/")
+        if member.islnk() and not within_root(member.linkname):
+            raise MigrationError(f"Backup member {member.name!r} links outside {BACKUP_ARCHIVE_ROOT}/")
+        try:
+            tarfile.data_filter(member, str(self.data_dir.parent))
+        except tarfile.FilterError as e:
+            raise MigrationError(f"Unsafe backup member: {e}")
+    
+    def _check_with_external_tools(self, backup_path: Path, decompress_command: List[str]) -> bool:
+        """
+        Run every backup member through _check_backup_member without extracting anything.
+        
+        Returns:
+            True if the backup decompressed cleanly, False if the decompress tool failed
+            
+        Raises:
+            MigrationError: If a member is not safe to extract
+            tarfile.TarError: If the tool succeeded but its output is not a readable archive
+        """
+        read_error = None
+        with subprocess.Popen(decompress_command + [str(backup_path)], stdout=subprocess.PIPE) as decompress:
+            try:
+                with tarfile.open(fileobj=decompress.stdout, mode='r|', bufsize=BACKUP_BUFSIZE) as tar:
+                    for member in tar:
+                        self._check_backup_member(member)
+                # Drain the end-of-archive padding so the tool is not killed by a closed pipe
+                while decompress.stdout.read(BACKUP_BUFSIZE):
+                    pass
+            except tarfile.TarError as e:
+                # A tool that died early leaves a truncated stream; its exit status decides below
+                read_error = e
+            finally:
+                decompress.stdout.close()
+        if decompress.returncode != 0:
+            return False
+        if read_error is not None:
+            raise read_error
+        return True
+    
+    def _extract_with_external_tools(self, backup_path: Path, decompress_command: List[str]) -> bool:
+        """
+        Pipe the decompressed backup into tar; returns True if both processes succeeded.
+        
+        Only the data directory is extracted, without restoring owners or permissions;
+        members must already have passed _check_with_external_tools.
+        """
+        extract_command = ['tar', '-xf', '-', '--no-same-owner', '--no-same-permissions',
+                           '-C', str(self.data_dir.parent), BACKUP_ARCHIVE_ROOT]
+        with subprocess.Popen(decompress_command + [str(backup_path)], stdout=subprocess.PIPE) as decompress:
+            extract = subprocess.run(extract_command, stdin=decompress.stdout)
+        return decompress.returncode == 0 and extract.returncode == 0
+    
     def list_backups(self) -> List[Path]:
         """List all available backup files."""
-        backups = list(self.backup_dir.glob("data_backup_*.tar.gz"))
-        backups.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-        return backups
+        # DirEntry caches its stat result, so sorting costs no extra syscalls
+        with os.scandir(self.backup_dir) as entries:
+            backups = [entry for entry in entries
+                       if entry.name.startswith("data_backup_") and entry.name.endswith(BACKUP_EXTENSIONS)]
+        backups.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [Path(entry.path) for entry in backups]
     
     def run_migration(self, migration_name: str, migration_func: Callable[[Path], bool]) -> bool:
         """
@@ -124,45 +292,50 @@ class DataMigrator:
         Returns:
             True if migration successful
         """
-        migration_logger.info(f"🔧 Starting migration: {migration_name}")
-        
-        # Create backup before migration
-        try:
-            backup_path = self.create_backup(migration_name)
-        except MigrationError as e:
-            migration_logger.error(f"❌ Migration aborted due to backup failure: {e}")
-            return False
-        
-        # Run the migration
         try:
-            migration_logger.info(f"⚡ Executing migration function...")
-            success = migration_func(self.data_dir)
+            migration_logger.info(f"🔧 Starting migration: {migration_name}")
             
-            if success:
-                migration_logger.info(f"✅ Migration '{migration_name}' completed successfully")
-                return True
-            else:
-                migration_logger.error(f"❌ Migration '{migration_name}' failed")
+            # Create backup before migration
+            try:
+                backup_path = self.create_backup(migration_name)
+            except MigrationError as e:
+                migration_logger.error(f"❌ Migration aborted due to backup failure: {e}")
                 return False
-                
-        except Exception as e:
-            migration_logger.error(f"💥 Migration '{migration_name}' crashed: {e}")
-            
-            # Offer to restore backup
-            migration_logger.info(f"🔄 Attempting automatic rollback...")
-            if self.restore_backup(backup_path):
-                migration_logger.info(f"✅ Rollback successful, data restored from backup")
-            else:
-                migration_logger.error(f"❌ Rollback failed! Manual restoration may be needed")
-                migration_logger.error(f"📋 Backup location: {backup_path}")
             
-            return False
+            # Run the migration
+            try:
+                migration_logger.info(f"⚡ Executing migration function...")
+                success = migration_func(self.data_dir)
+                
+                if success:
+                    migration_logger.info(f"✅ Migration '{migration_name}' completed successfully")
+                    return True
+                else:
+                    migration_logger.error(f"❌ Migration '{migration_name}' failed")
+                    return False
+                    
+            except Exception as e:
+                migration_logger.error(f"💥 Migration '{migration_name}' crashed: {e}")
+                
+                # Offer to restore backup
+                migration_logger.info(f"🔄 Attempting automatic rollback...")
+                if self.restore_backup(backup_path):
+                    migration_logger.info(f"✅ Rollback successful, data restored from backup")
+                else:
+                    migration_logger.error(f"❌ Rollback failed! Manual restoration may be needed")
+                    migration_logger.error(f"📋 Backup location: {backup_path}")
+                
+                return False
+        finally:
+            migration_buffer.flush()
     
     def get_listing_files(self) -> List[Path]:
         """Get all listing JSON files in the data directory."""
         if not self.data_dir.exists():
             return []
-        return list(self.data_dir.glob("*.json"))
+        with os.scandir(self.data_dir) as entries:
+            return [Path(entry.path) for entry in entries
+                    if entry.name.endswith('.json') and entry.is_file()]
     
     def load_listing(self, file_path: Path) -> Optional[Dict[str, Any]]:
         """
@@ -175,30 +348,75 @@ class DataMigrator:
             Listing data or None if loading failed
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return json_utils.load_file(file_path)
         except Exception as e:
             migration_logger.error(f"❌ Failed to load listing {file_path}: {e}")
             return None
     
-    def save_listing(self, file_path: Path, listing_data: Dict[str, Any]) -> bool:
+    def sync_files(self, file_paths: List[Path]) -> None:
         """
-        Save a listing to a JSON file.
+        Flush a batch of written listings, then the data directory, to disk.
         
-        Args:
-            file_path: Path to save the listing
-            listing_data: Listing data to save
-            
-        Returns:
-            True if save successful
+        Listings are saved without a per-file fsync; callers sync once after the
+        whole batch is written so the filesystem can coalesce the flushes.
         """
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(listing_data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            migration_logger.error(f"❌ Failed to save listing {file_path}: {e}")
-            return False
+        for file_path in file_paths:
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        if hasattr(os, 'O_DIRECTORY') and self.data_dir.exists():
+            dir_fd = os.open(self.data_dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+
+def _migrate_url_file(file_path: Path) -> Tuple[str, str]:
+    """
+    Migrate one listing file from a single 'url' to the multi-site 'urls' structure.
+    
+    Runs in pool workers, so it reports back instead of logging.
+    
+    Returns:
+        (outcome, detail) where outcome is 'migrated', 'skipped', 'no_url' or 'error'
+    """
+    try:
+        listing = json_utils.load_file(file_path)
+    except Exception as e:
+        return 'error', f"Failed to load listing {file_path}: {e}"
+    
+    data = listing.get('data', {})
+    
+    # Check if already migrated (has 'urls' field)
+    if 'urls' in data:
+        return 'skipped', ''
+    
+    # Check if has old 'url' field
+    if 'url' not in data:
+        return 'no_url', ''
+    
+    old_url = data['url']
+    
+    # Detect site from URL
+    site = detect_site_from_url(old_url)
+    
+    # Migrate to new structure
+    data['urls'] = {site: old_url}
+    data['last_updated_site'] = site
+    data['sites_seen'] = [site]
+    
+    # Remove old url field
+    del data['url']
+    
+    # Save migrated listing indented, as the Store and the schema migrations write listings
+    try:
+        json_utils.dump_file(listing, file_path)
+    except Exception as e:
+        return 'error', f"Failed to save listing {file_path}: {e}"
+    return 'migrated', f"{site} -> {old_url}"
 
 
 def migration_url_to_multi_site(data_dir: Path) -> bool:
@@ -217,54 +435,37 @@ def migration_url_to_multi_site(data_dir: Path) -> bool:
     
     migration_logger.info(f"📋 Found {len(listing_files)} listings to migrate")
     
-    migrated_count = 0
+    migrated_files = []
     error_count = 0
     
-    for file_path in listing_files:
-        listing = migrator.load_listing(file_path)
-        if not listing:
-            error_count += 1
-            continue
-        
-        data = listing.get('data', {})
-        
-        # Check if already migrated (has 'urls' field)
-        if 'urls' in data:
-            migration_logger.debug(f"⏭️ Skipping already migrated listing: {file_path.name}")
-            continue
-        
-        # Check if has old 'url' field
-        if 'url' not in data:
-            migration_logger.warning(f"⚠️ Listing {file_path.name} has no URL field, skipping")
-            continue
-        
-        old_url = data['url']
-        
-        # Detect site from URL
-        site = 'unknown'
-        if 'cargurus.com' in old_url.lower():
-            site = 'cargurus'
-        elif 'autotrader.com' in old_url.lower():
-            site = 'autotrader'
-        elif 'cars.com' in old_url.lower():
-            site = 'cars'
-        
-        # Migrate to new structure
-        data['urls'] = {site: old_url}
-        data['last_updated_site'] = site
-        data['sites_seen'] = [site]
-        
-        # Remove old url field
-        del data['url']
-        
-        # Save migrated listing
-        if migrator.save_listing(file_path, listing):
-            migrated_count += 1
-            migration_logger.debug(f"✅ Migrated {file_path.name}: {site} -> {old_url}")
-        else:
-            error_count += 1
+    # Listings are independent: overlap I/O on threads for small sets, spread JSON work over cores for large ones
+    if len(listing_files) >= PROCESS_POOL_THRESHOLD:
+        workers = os.cpu_count() or 1
+        chunksize = max(1, len(listing_files) // (workers * 4))
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        chunksize = 1
+        pool = ThreadPoolExecutor(max_workers=LISTING_LOAD_WORKERS)
+    
+    with pool:
+        results = pool.map(_migrate_url_file, listing_files, chunksize=chunksize)
+        for file_path, (outcome, detail) in zip(listing_files, results):
+            if outcome == 'migrated':
+                migrated_files.append(file_path)
+                migration_logger.debug(f"✅ Migrated {file_path.name}: {detail}")
+            elif outcome == 'skipped':
+                migration_logger.debug(f"⏭️ Skipping already migrated listing: {file_path.name}")
+            elif outcome == 'no_url':
+                migration_logger.warning(f"⚠️ Listing {file_path.name} has no URL field, skipping")
+            else:
+                error_count += 1
+                migration_logger.error(f"❌ {detail}")
+    
+    # Flush the rewritten files once the whole batch is written, before reporting success
+    if migrated_files:
+        migrator.sync_files(migrated_files)
     
-    migration_logger.info(f"📊 Migration complete: {migrated_count} migrated, {error_count} errors")
+    migration_logger.info(f"📊 Migration complete: {len(migrated_files)} migrated, {error_count} errors")
     
     return error_count == 0
 
@@ -298,8 +499,9 @@ def main():
         else:
             print("Available backups:")
             for backup in backups:
-                size = backup.stat().st_size / (1024 * 1024)
-                mtime = datetime.fromtimestamp(backup.stat().st_mtime)
+                stat = backup.stat()
+                size = stat.st_size / (1024 * 1024)
+                mtime = datetime.fromtimestamp(stat.st_mtime)
                 print(f"  {backup.name} ({size:.2f} MB, {mtime.strftime('%Y-%m-%d %H:%M:%S')})")
     
     elif command == "restore":
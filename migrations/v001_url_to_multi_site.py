@@ -50,7 +50,7 @@ def migrate(file_data: Dict[str, Any]) -> Dict[str, Any]:
     
     old_url = data['url']
     
-    # Detect site from URL
+    # Detect site from URL (kept local, in its original order, so historical output never moves)
     site = 'unknown'
     if 'cargurus.com' in old_url.lower():
         site = 'cargurus'
@@ -7,10 +7,14 @@ This is the bootstrap migration that introduces the versioning system itself.
 """
 
 import logging
+import re
 from typing import Dict, Any
 
 migration_logger = logging.getLogger('schema_migrations')
 
+# A 17-character VIN: ASCII letters and digits except I, O and Q
+_is_vin = re.compile(r'[A-HJ-NPR-Z0-9]{17}\Z', re.IGNORECASE).match
+
 def migrate(file_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Add schema version 2 to file data.
@@ -24,16 +28,20 @@ def migrate(file_data: Dict[str, Any]) -> Dict[str, Any]:
     migration_logger.debug("🔧 Adding schema_version field")
     
     # Check if this looks like an old-style index file (has VIN-like keys but no structure)
-    has_vin_keys = any(key for key in file_data.keys() if len(key) == 17 and key.isalnum())
-    is_unstructured_index = has_vin_keys and 'vin_mappings' not in file_data and 'schema_version' not in file_data
+    # (cheap key checks first; the VIN scan stops at the first VIN-like key)
+    is_unstructured_index = (
+        'vin_mappings' not in file_data and
+        'schema_version' not in file_data and
+        any(len(key) == 17 and _is_vin(key) for key in file_data)
+    )
     
     if is_unstructured_index:
-        # This looks like an old-style index file - wrap the VIN mappings
+        # This looks like an old-style index file - wrap the VIN mappings in place
+        # (schema_version is known to be absent, so every key is a mapping)
         migration_logger.debug("🔧 Wrapping VIN mappings in index file")
-        vin_mappings = {k: v for k, v in file_data.items() if k != 'schema_version'}
         file_data = {
             'schema_version': 2,
-            'vin_mappings': vin_mappings
+            'vin_mappings': file_data
         }
     else:
         # Regular data file - just add schema version at top level
@@ -11,20 +11,83 @@ This migration adds four date fields to track the lifecycle of each listing:
 Historical dates are back-filled by parsing app.log for relevant events.
 """
 
+import functools
 import logging
+import mmap
 import re
 import os
-from datetime import datetime
+from collections import defaultdict
 from typing import Dict, Any, Optional
 
 migration_logger = logging.getLogger('schema_migrations')
 
-# Regex patterns for parsing app.log
-LOG_PATTERNS = {
-    'new_listing': re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - INFO - Saved new listing with ID ([a-f0-9-]+) and VIN ([A-Z0-9]+)'),
-    'existing_listing': re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - INFO - Listing with VIN ([A-Z0-9]+) already exists with ID ([a-f0-9-]+)'),
-    'updated_listing': re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - INFO - Updated listing ([a-f0-9-]+):')
-}
+# Regex matching every app.log event of interest in one pass over the raw bytes;
+# the named group that matched says which kind of event it was
+LOG_EVENT_PATTERN = re.compile(
+    rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - INFO - (?:'
+    rb'Saved new listing with ID (?P<new_listing>[a-f0-9-]+) and VIN [A-Z0-9]+'
+    rb'|Listing with VIN [A-Z0-9]+ already exists with ID (?P<existing_listing>[a-f0-9-]+)'
+    rb'|Updated listing (?P<updated_listing>[a-f0-9-]+):)'
+)
+
+# Slots in the per-listing scan record; each holds a raw log timestamp or None
+_CREATED, _MODIFIED, _SEEN = range(3)
+
+def _log_timestamp_to_iso(timestamp: Optional[bytes]) -> Optional[str]:
+    """Convert a raw 'YYYY-MM-DD HH:MM:SS' log timestamp to ISO form (just the 'T' separator)."""
+    if timestamp is None:
+        return None
+    timestamp_str = timestamp.decode('ascii')
+    return f"{timestamp_str[:10]}T{timestamp_str[11:]}"
+
+@functools.lru_cache(maxsize=4)
+def _parse_log_file(log_file: str, mtime_ns: int, size: int) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Parse one log file into per-listing dates.
+    
+    Cached on (path, mtime_ns, size) so repeated calls in a process share one parse
+    until the log changes; callers must copy before mutating the result.
+    """
+    # Raw timestamps per listing ID, starting empty on first sight
+    listing_events = defaultdict(lambda: [None, None, None])
+    
+    with open(log_file, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            log_data = b''
+        else:
+            log_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        # IDs and timestamps stay as bytes while scanning; only the surviving
+        # timestamps are converted once the scan is done
+        for match in LOG_EVENT_PATTERN.finditer(log_data):
+            event = match.lastgroup
+            events = listing_events[match.group(event)]
+            timestamp = match.group(1)
+            
+            if event == 'new_listing':
+                # Set creation date (earliest wins)
+                if events[_CREATED] is None:
+                    events[_CREATED] = timestamp
+            elif event == 'updated_listing':
+                # Update last modified date (latest wins)
+                events[_MODIFIED] = timestamp
+            
+            # Every event means the listing was seen (latest wins)
+            events[_SEEN] = timestamp
+        
+        if isinstance(log_data, mmap.mmap):
+            log_data.close()
+    
+    return {
+        listing_id.decode('ascii'): {
+            'created_date': _log_timestamp_to_iso(events[_CREATED]),
+            'last_modified_date': _log_timestamp_to_iso(events[_MODIFIED]),
+            'last_seen_date': _log_timestamp_to_iso(events[_SEEN]),
+            'deleted_date': None
+        }
+        for listing_id, events in listing_events.items()
+    }
 
 def parse_app_log(data_dir: str) -> Dict[str, Dict[str, Optional[str]]]:
     """
@@ -57,91 +120,10 @@ def parse_app_log(data_dir: str) -> Dict[str, Dict[str, Optional[str]]]:
     
     migration_logger.info(f"📖 Reading log file: {log_file}")
     
-    # Load existing VIN to ID mappings to resolve VINs to listing IDs
-    vin_to_id = {}
     try:
-        vin_index_path = os.path.join(data_dir, 'indices', 'vin_to_id.json')
-        if os.path.exists(vin_index_path):
-            import json
-            with open(vin_index_path, 'r') as f:
-                index_data = json.load(f)
-                if 'vin_mappings' in index_data:
-                    vin_to_id = index_data['vin_mappings']
-                else:
-                    # Old format
-                    vin_to_id = {k: v for k, v in index_data.items() if k != 'schema_version'}
-    except Exception as e:
-        migration_logger.warning(f"⚠️ Could not load VIN index: {e}")
-    
-    # Track dates for each listing ID
-    listing_dates = {}
-    
-    try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Check for new listing creation
-                match = LOG_PATTERNS['new_listing'].search(line)
-                if match:
-                    timestamp_str, listing_id, vin = match.groups()
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S').isoformat()
-                    
-                    if listing_id not in listing_dates:
-                        listing_dates[listing_id] = {
-                            'created_date': None,
-                            'last_modified_date': None,
-                            'last_seen_date': None,
-                            'deleted_date': None
-                        }
-                    
-                    # Set creation date (earliest wins)
-                    if not listing_dates[listing_id]['created_date']:
-                        listing_dates[listing_id]['created_date'] = timestamp
-                    
-                    # Update last seen date (latest wins)
-                    listing_dates[listing_id]['last_seen_date'] = timestamp
-                    continue
-                
-                # Check for existing listing (last seen update)
-                match = LOG_PATTERNS['existing_listing'].search(line)
-                if match:
-                    timestamp_str, vin, listing_id = match.groups()
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S').isoformat()
-                    
-                    if listing_id not in listing_dates:
-                        listing_dates[listing_id] = {
-                            'created_date': None,
-                            'last_modified_date': None,
-                            'last_seen_date': None,
-                            'deleted_date': None
-                        }
-                    
-                    # Update last seen date (latest wins)
-                    listing_dates[listing_id]['last_seen_date'] = timestamp
-                    continue
-                
-                # Check for listing updates (modified date)
-                match = LOG_PATTERNS['updated_listing'].search(line)
-                if match:
-                    timestamp_str, listing_id = match.groups()
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S').isoformat()
-                    
-                    if listing_id not in listing_dates:
-                        listing_dates[listing_id] = {
-                            'created_date': None,
-                            'last_modified_date': None,
-                            'last_seen_date': None,
-                            'deleted_date': None
-                        }
-                    
-                    # Update last modified date (latest wins)
-                    listing_dates[listing_id]['last_modified_date'] = timestamp
-                    # Also update last seen date
-                    listing_dates[listing_id]['last_seen_date'] = timestamp
-                    continue
+        stat = os.stat(log_file)
+        cached_dates = _parse_log_file(os.path.abspath(log_file), stat.st_mtime_ns, stat.st_size)
+        listing_dates = {listing_id: dict(dates) for listing_id, dates in cached_dates.items()}
     
     except Exception as e:
         migration_logger.error(f"❌ Error parsing app.log: {e}")
@@ -150,6 +132,15 @@ def parse_app_log(data_dir: str) -> Dict[str, Dict[str, Optional[str]]]:
     migration_logger.info(f"📊 Extracted date information for {len(listing_dates)} listings")
     return listing_dates
 
+def prepare(migration_context: Dict[str, Any]) -> None:
+    """
+    Parse app.log once for a whole migration run, before any file is migrated.
+    
+    Args:
+        migration_context: Context shared by every file in the run; must include data_dir
+    """
+    migration_context['historical_dates'] = parse_app_log(migration_context['data_dir'])
+
 def migrate(file_data: Dict[str, Any], migration_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Add date tracking fields to listing data.
@@ -188,14 +179,10 @@ def migrate(file_data: Dict[str, Any], migration_context: Optional[Dict[str, Any
     fallback_date = "2025-07-13T12:00:00"  # Reasonable project start date
     
     # Add date fields to the listing data (only if they don't already exist)
-    if 'created_date' not in file_data:
-        file_data['created_date'] = listing_dates.get('created_date') or fallback_date
-    if 'last_modified_date' not in file_data:
-        file_data['last_modified_date'] = listing_dates.get('last_modified_date') or fallback_date
-    if 'last_seen_date' not in file_data:
-        file_data['last_seen_date'] = listing_dates.get('last_seen_date') or fallback_date
-    if 'deleted_date' not in file_data:
-        file_data['deleted_date'] = listing_dates.get('deleted_date')  # None for active listings
+    file_data.setdefault('created_date', listing_dates.get('created_date') or fallback_date)
+    file_data.setdefault('last_modified_date', listing_dates.get('last_modified_date') or fallback_date)
+    file_data.setdefault('last_seen_date', listing_dates.get('last_seen_date') or fallback_date)
+    file_data.setdefault('deleted_date', listing_dates.get('deleted_date'))  # None for active listings
     
     migration_logger.debug(f"✅ Added date tracking for listing {listing_id}")
     return file_data
\ No newline at end of file
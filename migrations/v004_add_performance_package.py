@@ -16,8 +16,7 @@ def migrate_listing(listing_data):
         dict: The migrated listing data
     """
     # Initialize performance_package as None (unknown/not set)
-    if 'performance_package' not in listing_data['data']:
-        listing_data['data']['performance_package'] = None
+    listing_data['data'].setdefault('performance_package', None)
     
     return listing_data
 
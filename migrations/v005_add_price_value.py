@@ -0,0 +1,65 @@
+"""
+Migration v005: Add numeric price_value field
+
+Adds a top-level price_value integer parsed from the listing's display price
+(e.g. "$25,000" -> 25000). The store maintains this value at ingest time so
+the listings page can sort by price without re-parsing strings per request.
+"""
+
+# Deletes currency and thousands separators in one pass: "$25,000" -> "25000"
+_STRIP_PRICE_FORMATTING = str.maketrans('', '', '$,')
+
+def parse_price(price_str):
+    """
+    Parse a display price string into whole dollars.
+
+    Kept local to this migration so historical behaviour does not change
+    if the application's parsing helpers evolve.
+    """
+    try:
+        return int(price_str.translate(_STRIP_PRICE_FORMATTING).split('.')[0])
+    except (ValueError, AttributeError):
+        return 0
+
+def migrate_listing(listing_data):
+    """
+    Add price_value field to listing data.
+    
+    Args:
+        listing_data (dict): The listing data to migrate
+        
+    Returns:
+        dict: The migrated listing data
+    """
+    # Always derive from the current price so re-running stays consistent
+    listing_data['price_value'] = parse_price(listing_data['data'].get('price'))
+    
+    return listing_data
+
+def migrate(data):
+    """
+    Main migration function for compatibility with migration system.
+    Handles both listing data and index data.
+    
+    Args:
+        data (dict): The data to migrate (listing or index)
+        
+    Returns:
+        dict: The migrated data
+    """
+    # Check if this is listing data (has 'data' key) or index data (has 'vin_mappings' key)
+    if 'data' in data:
+        return migrate_listing(data)
+    else:
+        # This is index data or other data - no changes needed for v005
+        return data
+
+def get_migration_info():
+    """Return information about this migration"""
+    return {
+        'version': 5,
+        'description': 'Add numeric price_value field',
+        'adds_fields': ['price_value'],
+        'removes_fields': [],
+        'modifies_fields': []
+    }
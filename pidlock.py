@@ -4,14 +4,23 @@ PID lock management for ensuring single instance execution.
 """
 
 import os
-import psutil
+import select
+import sys
 import signal
 import logging
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Command-line fragments that identify a running GTI Listings process
+OUR_PROCESS_INDICATORS = ('app.py', 'gti-listings', 'flask')
+_OUR_PROCESS_INDICATORS_BYTES = tuple(indicator.encode() for indicator in OUR_PROCESS_INDICATORS)
+
+# Pauses between looks at a lock file that cannot be read yet (seconds)
+LOCK_RETRY_DELAYS = (0.05, 0.1, 0.2, 0.4)
+
 class PidLock:
     """Manages PID lock file to prevent multiple instances."""
 
@@ -32,36 +41,141 @@ class PidLock:
         Returns:
             True if lock acquired successfully, False if another instance exists
         """
-        if self.lock_file.exists():
-            existing_pid = self._read_existing_pid()
-            if existing_pid:
-                if self._is_our_process_running(existing_pid):
-                    logger.info(f"🔒 GTI Listings is already running (PID {existing_pid}). Current process PID: {self.current_pid}. Exiting.")
-                    return False
-                elif self._is_process_running(existing_pid):
-                    logger.warning(f"⚠️ PID {existing_pid} exists but doesn't appear to be GTI Listings")
-                    logger.warning("🚨 ANOTHER PROCESS IS USING OUR PID FILE - ABORTING FOR SAFETY")
-                    return False
-                else:
-                    logger.info(f"🧹 Stale PID file found (PID {existing_pid} not running), cleaning up")
-                    self._remove_lock_file()
-
-        # Create new lock file
-        return self._create_lock_file()
+        for delay in LOCK_RETRY_DELAYS + (None,):
+            # Linking a fully written file into place is atomic, so of several racing starts exactly one wins
+            try:
+                return self._create_lock_file()
+            except FileExistsError:
+                pass
+
+            stale = self._clear_stale_lock()
+            if stale is False:
+                return False
+            if stale is None:
+                # Unreadable lock files are treated as held: look again shortly rather than removing them
+                if delay is None:
+                    break
+                time.sleep(delay)
+
+        logger.error(f"🚨 PID lock file {self.lock_file} is unreadable and not being replaced - remove it manually if no instance is running")
+        return False
+
+    def _clear_stale_lock(self) -> Optional[bool]:
+        """
+        Check the process named in an existing lock file and remove the file if it is stale.
+
+        Returns:
+            True if the lock file was stale and has been removed (or is already gone),
+            False if it is held, None if it could not be read
+        """
+        existing_pid, identity = self._read_lock_file()
+        if identity is None:
+            return True  # Removed since our create attempt - just try again
+        if not existing_pid:
+            logger.debug("PID lock file is empty or unparseable, treating it as held")
+            return None
+
+        # Pin the process so a recycled PID cannot pass the checks below
+        try:
+            pidfd = self._open_pidfd(existing_pid)
+        except ProcessLookupError:
+            pidfd = None
+            is_ours = is_running = False
+        else:
+            try:
+                is_ours = self._is_our_process_running(existing_pid)
+                is_running = is_ours or self._is_process_running(existing_pid)
+                # Still alive through the pidfd means what we read was this process
+                if is_running and pidfd is not None and not self._pidfd_alive(pidfd):
+                    is_ours = is_running = False
+            finally:
+                if pidfd is not None:
+                    os.close(pidfd)
+
+        if is_ours:
+            logger.info(f"🔒 GTI Listings is already running (PID {existing_pid}). Current process PID: {self.current_pid}. Exiting.")
+            return False
+        elif is_running:
+            logger.warning(f"⚠️ PID {existing_pid} exists but doesn't appear to be GTI Listings")
+            logger.warning("🚨 ANOTHER PROCESS IS USING OUR PID FILE - ABORTING FOR SAFETY")
+            return False
+
+        logger.info(f"🧹 Stale PID file found (PID {existing_pid} not running), cleaning up")
+        self._remove_stale_lock_file(identity)
+        return True
+
+    def _remove_stale_lock_file(self, identity):
+        """
+        Remove the lock file only if it is still the file that was judged stale.
+
+        Another starter may have cleared the stale file and created a fresh lock since
+        it was checked, so the file is moved aside first and put back if it was replaced.
+        """
+        aside = self.lock_file.with_name(f"{self.lock_file.name}.stale.{self.current_pid}")
+        try:
+            os.rename(self.lock_file, aside)
+        except FileNotFoundError:
+            return  # Another starter already cleaned it up
+        try:
+            moved = os.stat(aside)
+            if (moved.st_dev, moved.st_ino, moved.st_mtime_ns) != identity:
+                try:
+                    os.link(aside, self.lock_file)
+                    logger.debug("PID lock file was replaced by a live lock while checking it, restored it")
+                except FileExistsError:
+                    logger.warning("⚠️ PID lock file changed hands while cleaning up a stale lock")
+        finally:
+            os.unlink(aside)
+
+    def wait_for_existing(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the process named in the lock file to exit.
+
+        Args:
+            timeout: Seconds to wait, or None to wait indefinitely
+
+        Returns:
+            True if no other process holds the lock or it exited in time, False on timeout
+        """
+        existing_pid = self._read_existing_pid()
+        if not existing_pid or existing_pid == self.current_pid:
+            return True
+
+        try:
+            pidfd = self._open_pidfd(existing_pid)
+        except ProcessLookupError:
+            return True
+
+        if pidfd is not None:
+            # A pidfd becomes readable when its process exits, so the kernel wakes us exactly then
+            try:
+                readable, _, _ = select.select([pidfd], [], [], timeout)
+                return bool(readable)
+            finally:
+                os.close(pidfd)
+
+        # No pidfd support (non-Linux or kernel < 5.3)
+        import psutil
+        try:
+            _, alive = psutil.wait_procs([psutil.Process(existing_pid)], timeout=timeout)
+            return not alive
+        except psutil.NoSuchProcess:
+            return True
 
     def release(self):
         """Release the PID lock by removing the lock file."""
-        if self.lock_file.exists():
-            try:
-                # Verify this is our lock file before removing
-                existing_pid = self._read_existing_pid()
-                if existing_pid == self.current_pid:
-                    self._remove_lock_file()
-                    logger.info(f"🔓 Released PID lock (PID {self.current_pid})")
-                else:
-                    logger.warning(f"⚠️ Lock file PID mismatch: expected {self.current_pid}, found {existing_pid}")
-            except Exception as e:
-                logger.error(f"Error releasing PID lock: {e}")
+        try:
+            # Verify this is our lock file before removing (a missing or unreadable file means nothing to release)
+            existing_pid = self._read_existing_pid()
+            if existing_pid is None:
+                return
+            if existing_pid == self.current_pid:
+                self._remove_lock_file()
+                logger.info(f"🔓 Released PID lock (PID {self.current_pid})")
+            else:
+                logger.warning(f"⚠️ Lock file PID mismatch: expected {self.current_pid}, found {existing_pid}")
+        except Exception as e:
+            logger.error(f"Error releasing PID lock: {e}")
 
     def register_cleanup(self):
         """Register signal handlers for automatic cleanup."""
@@ -88,16 +202,82 @@ class PidLock:
 
     def _read_existing_pid(self) -> Optional[int]:
         """Read PID from existing lock file."""
+        return self._read_lock_file()[0]
+
+    def _read_lock_file(self) -> Tuple[Optional[int], Optional[Tuple[int, int, int]]]:
+        """
+        Read the lock file's PID together with the identity of the file it came from.
+
+        Returns:
+            (pid, (st_dev, st_ino, st_mtime_ns)); pid is None if the file is empty or
+            unparseable, and both are None if there is no lock file. The mtime guards
+            against a new lock file reusing the inode of a removed one (a rename does not
+            change it)
+        """
         try:
-            with open(self.lock_file, 'r') as f:
-                return int(f.read().strip())
-        except (ValueError, FileNotFoundError, PermissionError) as e:
+            with open(self.lock_file, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+                content = f.read()
+        except FileNotFoundError:
+            return None, None
+        except PermissionError as e:
             logger.debug(f"Could not read PID from lock file: {e}")
+            return None, None
+        try:
+            return int(content.strip()), identity
+        except ValueError as e:
+            logger.debug(f"Could not read PID from lock file: {e}")
+            return None, identity
+
+    def _open_pidfd(self, pid: int) -> Optional[int]:
+        """
+        Open a pidfd referring to pid (Linux 5.3+).
+
+        Returns:
+            The pidfd, or None if pidfds are unsupported or cannot be opened
+
+        Raises:
+            ProcessLookupError: If no process with this PID exists
+        """
+        if not hasattr(os, 'pidfd_open'):
             return None
+        try:
+            return os.pidfd_open(pid)
+        except ProcessLookupError:
+            raise
+        except OSError as e:
+            logger.debug(f"pidfd_open unavailable for PID {pid}: {e}")
+            return None
+
+    def _pidfd_alive(self, pidfd: int) -> bool:
+        """Check that the process behind a pidfd has not exited."""
+        try:
+            signal.pidfd_send_signal(pidfd, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True  # Exists, but cannot be signalled by us
 
     def _is_process_running(self, pid: int) -> bool:
         """Check if a process with given PID is running."""
+        if os.name == 'posix':
+            # Signal 0 only checks that the PID exists and can be signalled
+            try:
+                os.kill(pid, 0)
+                return True
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                return True  # Exists, but belongs to another user
+            except OSError as e:
+                logger.debug(f"Error checking if PID {pid} exists: {e}")
+                return False
+
+        # os.kill would terminate the process on Windows; psutil is only needed here
         try:
+            import psutil
             return psutil.pid_exists(pid)
         except Exception as e:
             logger.debug(f"Error checking if PID {pid} exists: {e}")
@@ -105,33 +285,53 @@ class PidLock:
 
     def _is_our_process_running(self, pid: int) -> bool:
         """Check if the process looks like our GTI Listings app."""
+        if not self._is_process_running(pid):
+            return False
+
         try:
-            if not psutil.pid_exists(pid):
-                return False
+            if sys.platform.startswith('linux'):
+                # Scan the raw NUL-separated arguments; no indicator spans an argument boundary
+                with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                    cmdline = f.read().lower()
+                return any(indicator in cmdline for indicator in _OUR_PROCESS_INDICATORS_BYTES)
 
-            process = psutil.Process(pid)
-            cmdline = process.cmdline()
+            import psutil
+            cmdline_str = ' '.join(psutil.Process(pid).cmdline()).lower()
 
             # Check if command line contains our app indicators
-            cmdline_str = ' '.join(cmdline).lower()
-            our_indicators = ['app.py', 'gti-listings', 'flask']
+            return any(indicator in cmdline_str for indicator in OUR_PROCESS_INDICATORS)
 
-            return any(indicator in cmdline_str for indicator in our_indicators)
-
-        except (psutil.NoSuchProcess, psutil.AccessDenied, Exception) as e:
+        except Exception as e:
             logger.debug(f"Error checking process {pid}: {e}")
             return False
 
     def _create_lock_file(self) -> bool:
-        """Create the PID lock file."""
+        """
+        Create the PID lock file, failing if it already exists.
+
+        The PID is written to a private temporary file that is then hard-linked into
+        place, so the lock file never exists without its contents.
+
+        Raises:
+            FileExistsError: If another process holds (or left behind) the lock file
+        """
+        temp_file = self.lock_file.with_name(f"{self.lock_file.name}.{self.current_pid}.tmp")
         try:
-            with open(self.lock_file, 'w') as f:
+            with open(temp_file, 'w') as f:
                 f.write(str(self.current_pid))
+            os.link(temp_file, self.lock_file)
             logger.debug(f"🔒 Created PID lock file with PID {self.current_pid}")
             return True
+        except FileExistsError:
+            raise
         except Exception as e:
             logger.error(f"Failed to create PID lock file: {e}")
             return False
+        finally:
+            try:
+                os.unlink(temp_file)
+            except FileNotFoundError:
+                pass
 
     def _remove_lock_file(self):
         """Remove the PID lock file."""
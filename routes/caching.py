@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+HTTP cache validator helpers for GTI Listings pages.
+Pages are tagged with the store's state token so browsers can revalidate cheaply.
+"""
+
+from flask import current_app, request
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this ETag, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return add_validators(current_app.response_class(status=304), etag)
+    return None
+
+def add_validators(response, etag):
+    """Tag a page response and make browsers revalidate it before reuse."""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
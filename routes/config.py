@@ -18,7 +18,7 @@ def create_config_routes(app, config_manager):
             config = config_manager.get_all()
             return render_template('config.html', config=config)
         except Exception as e:
-            logger.error(f"Error loading config page: {e}")
+            logger.error("Error loading config page: %s", e)
             return jsonify({"error": str(e)}), 500
     
     @app.route('/config', methods=['POST'])
@@ -26,20 +26,22 @@ def create_config_routes(app, config_manager):
         """Save configuration settings."""
         try:
             # Get form data
-            sample_setting = request.form.get('sample_setting', '').strip()
+            raw_setting = request.form.get('sample_setting', '')
             
-            # Validate the input (basic validation for now)
-            if len(sample_setting) > 1000:  # Reasonable limit
+            # Validate the input before copying it (basic validation for now)
+            if len(raw_setting) > 1000:  # Reasonable limit
                 return jsonify({"error": "Setting value too long (max 1000 characters)"}), 400
             
+            sample_setting = raw_setting.strip() if raw_setting else raw_setting
+            
             # Update configuration
             config_manager.set('sample_setting', sample_setting)
             
-            logger.info(f"Configuration updated: sample_setting = '{sample_setting}'")
+            logger.info("Configuration updated: sample_setting = '%s'", sample_setting)
             
             # Return success response
             return redirect(url_for('config_page'))
             
         except Exception as e:
-            logger.error(f"Error saving config: {e}")
+            logger.error("Error saving config: %s", e)
             return jsonify({"error": str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+URL converters for GTI Listings routes.
+Malformed listing IDs are rejected by the router with a 404 before any view or store lookup runs.
+"""
+
+from werkzeug.routing import BaseConverter
+
+class ListingIdConverter(BaseConverter):
+    """Match listing IDs: UUID-style runs of letters, digits and hyphens (never path characters)."""
+    regex = r'[0-9A-Za-z\-]{8,64}'
+
+def register_converters(app):
+    """Make the <lid:...> converter available to routes on this app (safe to call repeatedly)."""
+    app.url_map.converters['lid'] = ListingIdConverter
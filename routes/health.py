@@ -4,7 +4,8 @@ Health check route handler for GTI Listings app.
 Provides simple health check endpoint.
 """
 
-from flask import jsonify
+# Fixed health payload, encoded once at import
+HEALTH_BODY = b'{"status":"healthy"}\n'
 
 def create_health_routes(app):
     """Register health check routes with the Flask app."""
@@ -12,4 +13,5 @@ def create_health_routes(app):
     @app.route('/health', methods=['GET'])
     def health_check():
         """Simple health check endpoint."""
-        return jsonify({'status': 'healthy'}), 200
\ No newline at end of file
+        # A fresh Response per request: after_request hooks (CORS) add headers to it
+        return app.response_class(HEALTH_BODY, status=200, mimetype='application/json')
@@ -5,42 +5,68 @@ Handles detailed view of individual car listings.
 """
 
 import logging
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, make_response
+from routes.caching import not_modified, add_validators
+from routes.converters import register_converters
 
 logger = logging.getLogger(__name__)
 
+def _require_json():
+    """
+    Read the JSON body of the current request.
+    
+    Returns:
+        (data, None) on success, or (None, error_response) for a non-JSON or empty/malformed body
+    """
+    # Check content type first
+    if request.mimetype != 'application/json':
+        logger.error("Request content type is not JSON")
+        return None, (jsonify({'error': 'Content-Type must be application/json'}), 400)
+    
+    # Get JSON data from request (None for a missing or malformed body)
+    data = request.get_json(silent=True)
+    
+    if data is None:
+        logger.error("No JSON data provided in request")
+        return None, (jsonify({'error': 'No JSON data provided'}), 400)
+    
+    return data, None
+
 def create_individual_routes(app, store):
     """Register individual listing routes with the Flask app."""
+    register_converters(app)
+    
+    # Resolve the compiled detail template once instead of on every request
+    detail_template = app.jinja_env.get_template('listing_detail.html')
     
-    @app.route('/listing/<listing_id>', methods=['GET'])
+    @app.route('/listing/<lid:listing_id>', methods=['GET'])
     def view_listing(listing_id):
         """Display individual listing details."""
         try:
+            # Any change to the store bumps its version, so the client's copy is still current
+            etag = f"{store.instance_id}-{store.version}-{listing_id}"
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+            
             listing = store.get_listing_by_id(listing_id)
             
             if not listing:
                 return "Listing not found", 404
             
-            return render_template('listing_detail.html', listing=listing)
+            html = render_template(detail_template, listing=listing, field_count=len(listing['data']))
+            return add_validators(make_response(html), etag)
         except Exception as e:
-            logger.error(f"Error displaying listing {listing_id}: {str(e)}")
+            logger.error("Error displaying listing %s: %s", listing_id, e)
             return f"Error loading listing: {str(e)}", 500
     
-    @app.route('/listing/<listing_id>/comments', methods=['PUT'])
+    @app.route('/listing/<lid:listing_id>/comments', methods=['PUT'])
     def update_comments(listing_id):
         """Update comments for a specific listing."""
         try:
-            # Check content type first
-            if not request.is_json:
-                logger.error("Request content type is not JSON")
-                return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-            # Get JSON data from request
-            data = request.get_json()
-            
-            if data is None:
-                logger.error("No JSON data provided in request")
-                return jsonify({'error': 'No JSON data provided'}), 400
+            data, error_response = _require_json()
+            if error_response:
+                return error_response
             
             # Extract comments from request
             comments = data.get('comments', '')
@@ -49,34 +75,26 @@ def create_individual_routes(app, store):
             result = store.update_comments(listing_id, comments)
             
             if result['success']:
-                logger.info(f"Updated comments for listing {listing_id}")
+                logger.info("Updated comments for listing %s", listing_id)
                 return jsonify({
                     'message': result['message'],
                     'success': True
                 }), 200
             else:
-                logger.warning(f"Failed to update comments for listing {listing_id}: {result['message']}")
+                logger.warning("Failed to update comments for listing %s: %s", listing_id, result['message'])
                 return jsonify({'error': result['message']}), 404
         
         except Exception as e:
-            logger.error(f"Error updating comments for listing {listing_id}: {str(e)}")
+            logger.error("Error updating comments for listing %s: %s", listing_id, e)
             return jsonify({'error': 'Internal server error'}), 500
     
-    @app.route('/listing/<listing_id>/fields', methods=['PUT'])
+    @app.route('/listing/<lid:listing_id>/fields', methods=['PUT'])
     def update_editable_fields(listing_id):
         """Update editable fields for a specific listing."""
         try:
-            # Check content type first
-            if not request.is_json:
-                logger.error("Request content type is not JSON")
-                return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-            # Get JSON data from request
-            data = request.get_json()
-            
-            if data is None:
-                logger.error("No JSON data provided in request")
-                return jsonify({'error': 'No JSON data provided'}), 400
+            data, error_response = _require_json()
+            if error_response:
+                return error_response
             
             # Extract editable fields from request
             editable_fields = {}
@@ -87,15 +105,15 @@ def create_individual_routes(app, store):
             result = store.update_editable_fields(listing_id, editable_fields)
             
             if result['success']:
-                logger.info(f"Updated editable fields for listing {listing_id}: {editable_fields}")
+                logger.info("Updated editable fields for listing %s: %s", listing_id, editable_fields)
                 return jsonify({
                     'message': result['message'],
                     'success': True
                 }), 200
             else:
-                logger.warning(f"Failed to update editable fields for listing {listing_id}: {result['message']}")
+                logger.warning("Failed to update editable fields for listing %s: %s", listing_id, result['message'])
                 return jsonify({'error': result['message']}), 404
         
         except Exception as e:
-            logger.error(f"Error updating editable fields for listing {listing_id}: {str(e)}")
+            logger.error("Error updating editable fields for listing %s: %s", listing_id, e)
             return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
@@ -7,14 +7,48 @@ Handles main listing page and POST endpoint for new listings.
 import json
 import logging
 import csv
-import io
 import re
+import threading
+from operator import itemgetter
+from types import MappingProxyType
 from flask import request, jsonify, render_template, make_response
+from markupsafe import Markup
+from routes.caching import not_modified, add_validators
+from routes.converters import register_converters
 from desirability import add_desirability_scores
-from site_mappings import process_site_data, merge_site_data, check_desirability_completeness
+from site_mappings import process_site_data, merge_site_data
 
 logger = logging.getLogger(__name__)
 
+# Listing submissions are a few KB; anything far larger is rejected before parsing
+MAX_LISTING_PAYLOAD_BYTES = 64 * 1024
+
+# Core fields required for any listing (distance is optional)
+REQUIRED_LISTING_FIELDS = frozenset(('price', 'year', 'mileage', 'vin'))
+
+# Sort orders offered by the index page; anything else falls back to price
+INDEX_SORT_OPTIONS = ('price', 'desirability', 'last_seen_asc')
+
+# Distance in a location like "(123 mi away)" or "(1,234 mi away)", with flexible spacing
+DISTANCE_PATTERN = re.compile(r'\(\s*(\d+(?:,\d+)?)\s*mi\s+away\s*\)', re.IGNORECASE)
+_STRIP_COMMAS = str.maketrans('', '', ',')
+
+# Shared read-only stand-in for a listing without a 'data' dict, so lookups don't allocate one per listing
+_EMPTY_DATA = MappingProxyType({})
+
+# CSV export rows are coalesced into chunks of roughly this size before being sent
+STREAM_CHUNK_SIZE = 8 * 1024
+
+# Sort key for the index price order: the integer the store parses at ingest (or on load)
+price_sort_key = itemgetter('price_value')
+
+# Sort key for the index desirability order: add_desirability_scores sets a score on every listing
+desirability_sort_key = itemgetter('desirability_score')
+
+def last_seen_sort_key(listing):
+    """Sort key for the index last-seen order; ISO timestamps sort as strings, never-seen listings first."""
+    return listing.get('last_seen_date') or '1970-01-01T00:00:00'
+
 def extract_distance_from_location(location):
     """
     Extract distance from location text like "San Francisco, CA (1,888 mi away)".
@@ -22,17 +56,15 @@ def extract_distance_from_location(location):
     Returns:
         str: Numeric distance string like "1888" or None if not found
     """
-    if not location:
+    # The pattern needs a literal '(' so most locations are rejected without the regex
+    if not location or '(' not in location:
         return None
     
-    # Look for pattern like "(123 mi away)" or "(1,234 mi away)" with flexible spacing
-    distance_pattern = r'\(\s*(\d+(?:,\d+)?)\s*mi\s+away\s*\)'
-    match = re.search(distance_pattern, location, re.IGNORECASE)
+    match = DISTANCE_PATTERN.search(location)
     
     if match:
         # Extract just the number and remove commas
-        number_part = match.group(1).replace(',', '')
-        return number_part
+        return match.group(1).translate(_STRIP_COMMAS)
     
     return None
 
@@ -45,41 +77,180 @@ def process_listing_data(data):
         
     Returns:
         dict: Processed listing data with distance field populated if possible
+              (the input dict itself when nothing needs to change)
     """
-    processed_data = data.copy()
-    
     # If distance is not provided, empty, or "Unknown", try to extract it from location
-    distance_value = processed_data.get('distance')
+    distance_value = data.get('distance')
     should_extract_distance = (
-        'distance' not in processed_data or 
-        not distance_value or 
-        distance_value.lower() == 'unknown'
+        not distance_value or
+        (isinstance(distance_value, str) and distance_value.casefold() == 'unknown')
     )
     
     if should_extract_distance:
-        location = processed_data.get('location')
+        location = data.get('location')
         if location:
             extracted_distance = extract_distance_from_location(location)
             if extracted_distance:
+                # Copy only when there is something to change; the caller's dict is left as-is
+                processed_data = dict(data)
                 processed_data['distance'] = extracted_distance
-                logger.info(f"Extracted distance '{extracted_distance}' from location: {location}")
+                logger.info("Extracted distance '%s' from location: %s", extracted_distance, location)
+                return processed_data
+    
+    return data
+
+class _CSVBuffer:
+    """Write target for csv.writer that collects rows until they are taken as one UTF-8 chunk."""
+    
+    def __init__(self):
+        self.rows = []
+        self.size = 0
+    
+    def write(self, line):
+        self.rows.append(line)
+        self.size += len(line)
     
-    return processed_data
+    def take(self):
+        chunk = ''.join(self.rows).encode('utf-8')
+        self.rows = []
+        self.size = 0
+        return chunk
+
+def generate_csv_rows(listings):
+    """Yield the export CSV as UTF-8 chunks: a header, then link, price, year, mileage, vin per listing."""
+    buffer = _CSVBuffer()
+    writer = csv.writer(buffer)
+    
+    # Write header row
+    writer.writerow(['link', 'price', 'year', 'mileage', 'vin'])
+    
+    count = 0
+    for listing in listings:
+        data = listing.get('data', _EMPTY_DATA)
+        
+        # Get primary URL from multi-site structure
+        primary_url = ''
+        if 'urls' in data and data['urls']:
+            # Use URL from last_updated_site if available, otherwise first available URL
+            last_updated_site = data.get('last_updated_site')
+            if last_updated_site and last_updated_site in data['urls']:
+                primary_url = data['urls'][last_updated_site]
+            else:
+                # Fallback to first available URL
+                primary_url = next(iter(data['urls'].values()))
+        elif 'url' in data:
+            # Fallback for older single-URL format
+            primary_url = data['url']
+        
+        writer.writerow([
+            primary_url,
+            data.get('price', ''),
+            data.get('year', ''),
+            data.get('mileage', ''),
+            data.get('vin', '')
+        ])
+        count += 1
+        
+        # Send rows in coalesced, pre-encoded chunks rather than one write per row
+        if buffer.size >= STREAM_CHUNK_SIZE:
+            yield buffer.take()
+    
+    if buffer.rows:
+        yield buffer.take()
+    logger.info("Exported %s listings to CSV", count)
 
 def create_listings_routes(app, store):
     """Register listings routes with the Flask app."""
+    register_converters(app)
+    
+    # Resolve the compiled page template once instead of on every request
+    index_template = app.jinja_env.get_template('index.html')
+    
+    card_template = app.jinja_env.get_template('_listing_card.html')
+    
+    # Views may run on several threads at once (gunicorn --threads), so every cache
+    # entry below is built off to the side and published with a single assignment;
+    # readers take one reference and never see a half-updated entry.
+    
+    # Rendered index pages keyed by sort order: sort_by -> (store version, html)
+    index_page_cache = {}
+    
+    # Scored listings for the current store version, shared by every sort order: (version, listings)
+    scored_listings_cache = {'entry': (None, None)}
+    scored_listings_lock = threading.Lock()
+    
+    # Rendered listing cards keyed by listing ID: id -> (fingerprint, html)
+    card_cache = {'cards': {}}
+    
+    # The last exported CSV and the store version it was built from: (version, data)
+    csv_export_cache = {'entry': (None, None)}
+    
+    def render_listing_cards(listings):
+        """Render listing cards, reusing fragments for listings that have not changed."""
+        cards = []
+        fresh_cache = {}
+        cached_cards = card_cache['cards']
+        for listing in listings:
+            # Everything shown on a card changes last_modified_date or the score
+            fingerprint = (listing.get('last_modified_date'), listing.get('desirability_score'))
+            cached = cached_cards.get(listing['id'])
+            if cached and cached[0] == fingerprint:
+                card_html = cached[1]
+            else:
+                card_html = Markup(card_template.render(listing=listing))
+            fresh_cache[listing['id']] = (fingerprint, card_html)
+            cards.append(card_html)
+        
+        # Swap in the new fragments, dropping those for listings that no longer exist
+        card_cache['cards'] = fresh_cache
+        return cards
+    
+    def load_scored_listings(version):
+        """Return scored listings for this store version, loading them only once per version."""
+        cached_version, listings = scored_listings_cache['entry']
+        if cached_version == version:
+            # Each sort order reorders its own list; the listing dicts are shared
+            return list(listings)
+        
+        with scored_listings_lock:
+            # Another thread may have scored this version while we waited
+            cached_version, listings = scored_listings_cache['entry']
+            if cached_version == version:
+                return list(listings)
+            
+            # get_all_listings() returns fresh copies, so scoring them cannot disturb other threads
+            listings = store.get_all_listings()
+            
+            # Score all listings, flagging those with missing desirability fields in the same pass
+            listings = add_desirability_scores(listings, flag_incomplete=True)
+            
+            scored_listings_cache['entry'] = (version, listings)
+            return list(listings)
+    
+    def cache_csv_export(chunks, version):
+        """Pass CSV chunks through to the client and keep the complete file for this store version."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        csv_export_cache['entry'] = (version, b''.join(parts))
     
     @app.route('/listings', methods=['POST'])
     def add_listing():
         """Accept new listing data via POST request."""
         try:
             # Check content type first
-            if not request.is_json:
+            if request.mimetype != 'application/json':
                 logger.error("Request content type is not JSON")
                 return jsonify({'error': 'Content-Type must be application/json'}), 400
             
-            # Get JSON data from request
-            data = request.get_json()
+            # Reject oversized bodies before buffering and parsing them
+            if request.content_length and request.content_length > MAX_LISTING_PAYLOAD_BYTES:
+                logger.error("Listing payload too large: %s bytes", request.content_length)
+                return jsonify({'error': 'Payload too large'}), 413
+            
+            # Get JSON data from request (None for a missing or malformed body)
+            data = request.get_json(silent=True, cache=False)
             
             if data is None:
                 logger.error("No JSON data provided in request")
@@ -87,7 +258,7 @@ def create_listings_routes(app, store):
             
             # Log received data for debugging
             site_name = data.get('site', 'unknown')
-            logger.info(f"📥 Received listing data from {site_name}: {data}")
+            logger.info("📥 Received listing data from %s: %s", site_name, data)
             
             # Process site-specific data into internal format
             processed_data = process_site_data(data)
@@ -96,11 +267,10 @@ def create_listings_routes(app, store):
             processed_data = process_listing_data(processed_data)
             
             # Basic field check - core fields are required for any listing
-            required_fields = ['price', 'year', 'mileage', 'vin']
-            missing_fields = [field for field in required_fields if field not in processed_data]
+            missing_fields = sorted(REQUIRED_LISTING_FIELDS.difference(processed_data))
             
             if missing_fields:
-                logger.error(f"Missing required fields: {missing_fields}")
+                logger.error("Missing required fields: %s", missing_fields)
                 return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
             
             # Attempt to store or update the listing
@@ -108,7 +278,7 @@ def create_listings_routes(app, store):
             
             if result['success']:
                 # New listing created
-                logger.info(f"Added listing with VIN: {data.get('vin', 'N/A')}")
+                logger.info("Added listing with VIN: %s", data.get('vin', 'N/A'))
                 return jsonify({
                     'message': 'Listing added successfully', 
                     'id': result['id'],
@@ -116,7 +286,7 @@ def create_listings_routes(app, store):
                 }), 201
             elif result['updated']:
                 # Existing listing updated
-                logger.info(f"Updated listing with VIN: {data.get('vin', 'N/A')} - {result['change_summary']}")
+                logger.info("Updated listing with VIN: %s - %s", data.get('vin', 'N/A'), result['change_summary'])
                 return jsonify({
                     'message': f"Listing updated: {result['change_summary']}", 
                     'id': result['id'],
@@ -125,7 +295,7 @@ def create_listings_routes(app, store):
                 }), 200
             else:
                 # No changes detected
-                logger.info(f"No changes for listing with VIN: {data.get('vin', 'N/A')}")
+                logger.info("No changes for listing with VIN: %s", data.get('vin', 'N/A'))
                 return jsonify({
                     'message': 'No changes detected', 
                     'id': result['id'],
@@ -133,144 +303,103 @@ def create_listings_routes(app, store):
                 }), 200
         
         except Exception as e:
-            logger.error(f"Error processing listing: {str(e)}")
+            logger.error("Error processing listing: %s", e)
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/', methods=['GET'])
     def index():
         """Display all collected listings."""
         try:
-            listings = store.get_all_listings()
-            count = len(listings)
+            # Get sort parameter from query string; unknown values share the price page and its ETag
+            sort_by = request.args.get('sort', 'price')
+            if sort_by not in INDEX_SORT_OPTIONS:
+                sort_by = 'price'
             
-            # Calculate desirability scores for all listings
-            if listings:
-                # Check for listings with missing desirability fields
-                for listing in listings:
-                    is_complete, missing_fields = check_desirability_completeness(listing.get('data', {}))
-                    if not is_complete:
-                        logger.warning(f"⚠️ Listing {listing.get('id', 'unknown')} missing desirability fields: {missing_fields}")
-                        # Add warning flag for UI display
-                        listing['desirability_warning'] = f"Missing: {', '.join(missing_fields)}"
-                
-                listings = add_desirability_scores(listings)
+            # Let the browser reuse its copy if nothing has changed since it was sent
+            version = store.version
+            etag = f"{store.instance_id}-{version}-{sort_by}"
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
             
-            # Get sort parameter from query string
-            sort_by = request.args.get('sort', 'price')
+            # Serve the cached page if nothing has changed since it was rendered
+            cached = index_page_cache.get(sort_by)
+            if cached and cached[0] == version:
+                return add_validators(make_response(cached[1]), etag)
+            
+            listings = load_scored_listings(version)
+            count = len(listings)
             
             if sort_by == 'desirability':
                 # Sort by desirability score (highest first)
-                listings.sort(key=lambda x: x.get('desirability_score', 0), reverse=True)
+                listings.sort(key=desirability_sort_key, reverse=True)
                 sort_description = "Sorted by desirability"
             elif sort_by == 'last_seen_asc':
                 # Sort by last seen date (oldest first - least recently seen)
-                def extract_last_seen(listing):
-                    try:
-                        last_seen = listing.get('last_seen_date')
-                        if last_seen:
-                            # Return the ISO timestamp string for sorting
-                            return last_seen
-                        else:
-                            # If no last_seen_date, put at end (use a very old date)
-                            return '1970-01-01T00:00:00'
-                    except:
-                        return '1970-01-01T00:00:00'
-                
-                listings.sort(key=extract_last_seen)
+                listings.sort(key=last_seen_sort_key)
                 sort_description = "Sorted by last seen (least recently seen first)"
             else:
-                # Default: sort by price (lowest first)
-                def extract_price(listing):
-                    try:
-                        price_str = listing.get('data', {}).get('price', '$0')
-                        return int(price_str.replace('$', '').replace(',', ''))
-                    except:
-                        return 0
-                
-                listings.sort(key=extract_price)
+                # Default: sort by price (lowest first) using the value parsed at ingest
+                listings.sort(key=price_sort_key)
                 sort_description = "Sorted by price"
             
-            return render_template('index.html', 
-                                 listings=listings, 
-                                 count=count, 
-                                 sort_by=sort_by,
-                                 sort_description=sort_description)
+            html = render_template(index_template, 
+                                   listings=listings, 
+                                   listing_cards=render_listing_cards(listings),
+                                   count=count, 
+                                   sort_by=sort_by,
+                                   sort_description=sort_description)
+            
+            index_page_cache[sort_by] = (version, html)
+            
+            return add_validators(make_response(html), etag)
         except Exception as e:
-            logger.error(f"Error displaying listings: {str(e)}")
+            logger.error("Error displaying listings: %s", e)
             return f"Error loading listings: {str(e)}", 500
 
-    @app.route('/listings/<listing_id>', methods=['DELETE'])
+    @app.route('/listings/<lid:listing_id>', methods=['DELETE'])
     def delete_listing(listing_id):
         """Delete a listing by moving it to deleted folder and removing from index."""
         try:
             result = store.delete_listing(listing_id)
             
             if result['success']:
-                logger.info(f"Successfully deleted listing {listing_id}")
+                logger.info("Successfully deleted listing %s", listing_id)
                 return jsonify({
                     'message': result['message'],
                     'id': listing_id,
                     'vin': result.get('vin')
                 }), 200
             else:
-                logger.warning(f"Failed to delete listing {listing_id}: {result['message']}")
+                logger.warning("Failed to delete listing %s: %s", listing_id, result['message'])
                 return jsonify({'error': result['message']}), 404
         
         except Exception as e:
-            logger.error(f"Error deleting listing {listing_id}: {str(e)}")
+            logger.error("Error deleting listing %s: %s", listing_id, e)
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/listings/export.csv', methods=['GET'])
     def export_csv():
         """Export all listings to CSV with specified columns: link, price, year, mileage, vin."""
         try:
-            listings = store.get_all_listings()
-            
-            # Create CSV in memory
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header row
-            writer.writerow(['link', 'price', 'year', 'mileage', 'vin'])
+            # Let the client reuse its download if nothing has changed since it was sent
+            version = store.version
+            etag = f"{store.instance_id}-{version}-csv"
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
             
-            # Write data rows
-            for listing in listings:
-                data = listing.get('data', {})
-                
-                # Get primary URL from multi-site structure
-                primary_url = ''
-                if 'urls' in data and data['urls']:
-                    # Use URL from last_updated_site if available, otherwise first available URL
-                    last_updated_site = data.get('last_updated_site')
-                    if last_updated_site and last_updated_site in data['urls']:
-                        primary_url = data['urls'][last_updated_site]
-                    else:
-                        # Fallback to first available URL
-                        primary_url = next(iter(data['urls'].values()))
-                elif 'url' in data:
-                    # Fallback for older single-URL format
-                    primary_url = data['url']
-                
-                writer.writerow([
-                    primary_url,
-                    data.get('price', ''),
-                    data.get('year', ''),
-                    data.get('mileage', ''),
-                    data.get('vin', '')
-                ])
-            
-            # Create response
-            output.seek(0)
-            csv_data = output.getvalue()
-            output.close()
+            cached_version, cached_data = csv_export_cache['entry']
+            if cached_version == version:
+                body = cached_data
+            else:
+                # Stream in chunks instead of building the whole file in memory first
+                body = cache_csv_export(generate_csv_rows(store.iter_all_listings()), version)
             
-            response = make_response(csv_data)
-            response.headers['Content-Type'] = 'text/csv'
+            response = app.response_class(body, content_type='text/csv')
             response.headers['Content-Disposition'] = 'attachment; filename=gti-listings-export.csv'
-            
-            logger.info(f"Exported {len(listings)} listings to CSV")
-            return response
+            return add_validators(response, etag)
             
         except Exception as e:
-            logger.error(f"Error exporting CSV: {str(e)}")
-            return f"Error exporting CSV: {str(e)}", 500
\ No newline at end of file
+            logger.error("Error exporting CSV: %s", e)
+            return f"Error exporting CSV: {str(e)}", 500
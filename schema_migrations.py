@@ -4,18 +4,22 @@ Schema-versioned migration framework for GTI Listings app.
 Provides repeatable, safe data structure evolution with per-file version tracking.
 """
 
-import json
 import logging
 import tarfile
 import shutil
 import sys
 import os
+import functools
 import importlib.util
+import inspect
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
 import re
 
+import json_utils
+
 # Set up migration-specific logging
 migration_logger = logging.getLogger('schema_migrations')
 migration_handler = logging.FileHandler('migrations.log')
@@ -24,6 +28,27 @@ migration_handler.setFormatter(migration_formatter)
 migration_logger.addHandler(migration_handler)
 migration_logger.setLevel(logging.INFO)
 
+# Backups are written once before a migration and rarely read; favour speed over ratio
+BACKUP_COMPRESSLEVEL = 1
+
+# Listing files are small and migrate independently; overlap their per-file I/O latency
+MIGRATION_WORKERS = 16
+
+# Migration module filenames like v002_description.py; group 1 is the version number
+MIGRATION_FILE_PATTERN = re.compile(r'v(\d+)_.*\.py$')
+
+@functools.lru_cache(maxsize=64)
+def _accepts_context(migrate_func) -> bool:
+    """Check (once per migrate function) whether it takes the shared migration context."""
+    return len(inspect.signature(migrate_func).parameters) > 1
+
+def _load_json_or_none(path: Path) -> Optional[Dict[str, Any]]:
+    """Load a JSON file, returning None if it cannot be read or parsed (for pool workers)."""
+    try:
+        return json_utils.load_file(path)
+    except Exception:
+        return None
+
 class MigrationError(Exception):
     """Custom exception for migration errors."""
     pass
@@ -39,28 +64,39 @@ class SchemaMigrator:
         self.migrations_dir = Path(migrations_dir)
         self.backup_dir.mkdir(exist_ok=True)
         
+        # Discovered migration versions, reused until the migrations directory changes
+        self._available_migrations: Optional[List[int]] = None
+        self._available_migrations_mtime: Optional[int] = None
+        
         migration_logger.info(f"🚀 SchemaMigrator initialized - data: {self.data_dir}, backups: {self.backup_dir}, migrations: {self.migrations_dir}")
     
     def get_available_migrations(self) -> List[int]:
         """
         Get list of available migration versions from migrations directory.
         
+        The directory is only rescanned when its mtime changes (a migration file
+        was added, removed or renamed), since this is called for every file read.
+        
         Returns:
             List[int]: Sorted list of available migration version numbers
         """
-        if not self.migrations_dir.exists():
+        try:
+            dir_mtime = self.migrations_dir.stat().st_mtime_ns
+        except FileNotFoundError:
             return []
-            
-        migration_files = list(self.migrations_dir.glob("v*.py"))
-        versions = []
         
-        for file_path in migration_files:
-            # Extract version number from filename like v002_description.py
-            match = re.match(r'v(\d+)_.*\.py$', file_path.name)
-            if match:
-                versions.append(int(match.group(1)))
+        if self._available_migrations is None or dir_mtime != self._available_migrations_mtime:
+            versions = []
+            for file_path in self.migrations_dir.glob("v*.py"):
+                # Extract version number from filename like v002_description.py
+                match = MIGRATION_FILE_PATTERN.match(file_path.name)
+                if match:
+                    versions.append(int(match.group(1)))
+            
+            self._available_migrations = sorted(versions)
+            self._available_migrations_mtime = dir_mtime
         
-        return sorted(versions)
+        return list(self._available_migrations)
     
     def get_current_schema_version(self) -> int:
         """
@@ -83,8 +119,7 @@ class SchemaMigrator:
             int: Schema version of the file (0 if no version found)
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_utils.load_file(file_path)
             return data.get('schema_version', 0)
         except Exception as e:
             migration_logger.warning(f"Could not read schema version from {file_path}: {e}")
@@ -100,10 +135,8 @@ class SchemaMigrator:
         Returns:
             List[int]: Sorted list of migration versions to apply
         """
-        available = self.get_available_migrations()
-        target_version = self.get_current_schema_version()
-        
-        return [v for v in available if current_version < v <= target_version]
+        # Versions are sorted, so everything above current_version is pending
+        return [v for v in self.get_available_migrations() if v > current_version]
     
     def load_migration(self, version: int):
         """
@@ -156,14 +189,14 @@ class SchemaMigrator:
         
         if not self.data_dir.exists():
             migration_logger.warning(f"⚠️ Data directory {self.data_dir} does not exist, creating empty backup")
-            with tarfile.open(backup_path, "w:gz") as tar:
+            with tarfile.open(backup_path, "w:gz", compresslevel=BACKUP_COMPRESSLEVEL) as tar:
                 pass
             return backup_path
         
         migration_logger.info(f"📦 Creating backup: {backup_filename}")
         
         try:
-            with tarfile.open(backup_path, "w:gz") as tar:
+            with tarfile.open(backup_path, "w:gz", compresslevel=BACKUP_COMPRESSLEVEL) as tar:
                 tar.add(self.data_dir, arcname="data", recursive=True)
             
             backup_size = backup_path.stat().st_size / (1024 * 1024)  # MB
@@ -175,41 +208,60 @@ class SchemaMigrator:
             migration_logger.error(f"❌ Failed to create backup: {e}")
             raise MigrationError(f"Backup creation failed: {e}")
     
-    def migrate_file(self, file_path: Path, target_version: int) -> bool:
+    def load_migrations(self, versions: List[int]) -> Dict[int, Any]:
+        """
+        Load several migration modules up front so a batch of files can share them.
+        
+        Args:
+            versions: Migration versions to load
+            
+        Returns:
+            Dict[int, Any]: Migration modules keyed by version
+        """
+        return {version: self.load_migration(version) for version in versions}
+    
+    def migrate_file(self, file_path: Path, target_version: int,
+                     migration_modules: Optional[Dict[int, Any]] = None,
+                     migration_context: Optional[Dict[str, Any]] = None,
+                     file_data: Optional[Dict[str, Any]] = None) -> bool:
         """
         Migrate a single file to the target schema version.
         
         Args:
             file_path: Path to file to migrate
             target_version: Target schema version
+            migration_modules: Preloaded modules from load_migrations (others are loaded on demand)
+            migration_context: Context shared by every file in a batch (a fresh one if None)
+            file_data: The file's parsed contents, if the caller has already read it
             
         Returns:
             bool: True if migration successful
         """
-        current_version = self.get_file_schema_version(file_path)
-        pending = self.get_pending_migrations(current_version)
-        
-        if not pending:
-            migration_logger.debug(f"📋 {file_path.name} already at version {current_version}")
-            return True
-        
-        migration_logger.info(f"🔧 Migrating {file_path.name} from v{current_version} to v{target_version}")
-        
         try:
-            # Load current file content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_data = json.load(f)
+            # Read the file once (UTF-8 bytes, parsed by orjson when installed); its own
+            # schema_version says which migrations it still needs
+            if file_data is None:
+                file_data = json_utils.load_file(file_path)
+            current_version = file_data.get('schema_version', 0)
+            pending = [v for v in self.get_pending_migrations(current_version) if v <= target_version]
+            
+            if not pending:
+                migration_logger.debug(f"📋 {file_path.name} already at version {current_version}")
+                return True
+            
+            migration_logger.info(f"🔧 Migrating {file_path.name} from v{current_version} to v{target_version}")
             
             # Apply each pending migration
-            migration_context = {'data_dir': self.data_dir}
+            if migration_context is None:
+                migration_context = {'data_dir': self.data_dir}
             for version in pending:
                 migration_logger.debug(f"⚡ Applying migration v{version:03d} to {file_path.name}")
                 
-                migration_module = self.load_migration(version)
-                # Check if migration function accepts context parameter
-                import inspect
-                sig = inspect.signature(migration_module.migrate)
-                if len(sig.parameters) > 1:
+                if migration_modules and version in migration_modules:
+                    migration_module = migration_modules[version]
+                else:
+                    migration_module = self.load_migration(version)
+                if _accepts_context(migration_module.migrate):
                     file_data = migration_module.migrate(file_data, migration_context)
                 else:
                     file_data = migration_module.migrate(file_data)
@@ -217,9 +269,8 @@ class SchemaMigrator:
                 # Ensure schema version is updated
                 file_data['schema_version'] = version
             
-            # Save migrated file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(file_data, f, indent=2, ensure_ascii=False)
+            # Save migrated file in the layout the Store writes: indented listings, compact index
+            json_utils.dump_file(file_data, file_path, indent=file_path != self.get_index_file_path())
             
             migration_logger.info(f"✅ {file_path.name} migrated successfully to v{target_version}")
             return True
@@ -272,23 +323,45 @@ class SchemaMigrator:
         backup_path = self.create_backup(f"preflight_v{current_version}_to_v{target_version}")
         
         try:
-            # Migrate index first
-            index_path = self.get_index_file_path()
-            if index_path.exists():
-                if not self.migrate_file(index_path, target_version):
-                    raise MigrationError("Index migration failed")
+            # Load every migration once for the whole run (listing files may lag behind the index),
+            # and share one context so per-run work such as v003's log parse is done once
+            migration_modules = self.load_migrations(self.get_pending_migrations(0))
+            migration_context = {'data_dir': self.data_dir}
             
-            # Migrate all listing files
+            # Read all listing files up front, overlapping their reads; files that fail to parse
+            # are left for migrate_file to re-read and report
             listing_files = self.get_listing_files()
-            failed_files = []
+            with ThreadPoolExecutor(max_workers=MIGRATION_WORKERS) as executor:
+                listings = list(executor.map(_load_json_or_none, listing_files))
+            
+            # Let each migration any file still needs prepare shared state (such as v003's
+            # app.log parse) once, before the workers start, so they never race to do it
+            oldest_version = min([current_version] + [listing.get('schema_version', 0)
+                                                      for listing in listings if listing is not None])
+            for version in self.get_pending_migrations(oldest_version):
+                prepare = getattr(migration_modules[version], 'prepare', None)
+                if prepare is not None:
+                    prepare(migration_context)
             
-            for file_path in listing_files:
-                if not self.migrate_file(file_path, target_version):
-                    failed_files.append(file_path.name)
+            # Migrate all listing files; each is independent, so overlap their writes
+            with ThreadPoolExecutor(max_workers=MIGRATION_WORKERS) as executor:
+                results = executor.map(
+                    lambda file_path, listing: self.migrate_file(
+                        file_path, target_version, migration_modules, migration_context, listing),
+                    listing_files, listings
+                )
+                failed_files = [file_path.name for file_path, migrated in zip(listing_files, results) if not migrated]
             
             if failed_files:
                 raise MigrationError(f"Migration failed for files: {failed_files}")
             
+            # Migrate the index last: its version is what marks the data directory as current,
+            # so a failed run leaves it behind and the next start retries the remaining files
+            index_path = self.get_index_file_path()
+            if index_path.exists():
+                if not self.migrate_file(index_path, target_version, migration_modules, migration_context):
+                    raise MigrationError("Index migration failed")
+            
             migration_logger.info(f"✅ Preflight migration completed successfully")
             return True
             
@@ -5,6 +5,7 @@ Handles conversion from site-specific data to internal unified format.
 """
 
 import logging
+import re
 from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
@@ -36,6 +37,10 @@ SITE_CAPABILITIES = {
     ]
 }
 
+# Site domains recognised in listing URLs, matched case-insensitively in one pass
+SITE_URL_PATTERN = re.compile(r'(?P<cargurus>cargurus\.com)|(?P<autotrader>autotrader\.com)|(?P<cars>cars\.com)',
+                              re.IGNORECASE)
+
 # Define site-specific field mappings (site_field -> internal_field)
 SITE_FIELD_MAPPINGS = {
     'cargurus': {
@@ -280,3 +285,9 @@ def site_supports_field(site_key: str, internal_field: str) -> bool:
     """Check if a site supports a specific internal field."""
     capabilities = SITE_CAPABILITIES.get(site_key, [])
     return internal_field in capabilities
+
+
+def detect_site_from_url(url: str) -> str:
+    """Return the site key for a listing URL, or 'unknown' if no known domain appears in it."""
+    match = SITE_URL_PATTERN.search(url)
+    return match.lastgroup if match else 'unknown'
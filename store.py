@@ -4,19 +4,62 @@ Storage module for GTI listings.
 Handles persistence and deduplication based on VIN.
 """
 
-import json
+import json_utils
 import os
+import time
+import atexit
 import uuid
 import shutil
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
 from datetime import datetime
-from listing_utils import compare_listing_data, format_change_summary
+from listing_utils import compare_listing_data, format_change_summary, parse_price
 from site_mappings import merge_site_data
 from schema_migrations import SchemaMigrator
 
 logger = logging.getLogger(__name__)
 
+# During ingest bursts the VIN index is rewritten at most once per this many seconds
+VIN_INDEX_FLUSH_INTERVAL = 1.0
+
+# Threads used to read listing files in parallel when the listings cache is cold
+LISTING_LOAD_WORKERS = 8
+
+
+def _synchronized(method):
+    """Serialize a Store method on the instance lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Live stores, so one exit hook can write their deferred VIN index changes
+_open_stores = weakref.WeakSet()
+
+
+def _flush_open_stores():
+    """Write deferred VIN index changes of every live Store (registered with atexit)."""
+    for store in list(_open_stores):
+        store.flush_vin_index()
+
+
+atexit.register(_flush_open_stores)
+
+
+def _load_json_or_error(path):
+    """Load a JSON file, returning the exception instead of raising (for pool workers)."""
+    try:
+        return json_utils.load_file(path)
+    except Exception as e:
+        return e
+
+
 class Store:
     """Simple file-based storage with VIN deduplication."""
     
@@ -25,6 +68,18 @@ class Store:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
+        # Guards the VIN index and listing files when requests run concurrently
+        self._lock = threading.RLock()
+        
+        # Incremented on every change so callers can cache derived views
+        self.version = 0
+        
+        # Distinguishes this process's versions from those issued before a restart
+        self.instance_id = uuid.uuid4().hex[:8]
+        
+        # Listings by ID, loaded from disk on first read and kept in step with every write
+        self._listings_cache = None
+        
         # Create indices directory for tracking VINs
         self.indices_dir = self.data_dir / 'indices'
         self.indices_dir.mkdir(parents=True, exist_ok=True)
@@ -32,6 +87,45 @@ class Store:
         self.vin_index_file = self.indices_dir / 'vin_to_id.json'
         self.migrator = SchemaMigrator(str(self.data_dir))
         self.vin_index = self._load_vin_index()
+        
+        # Deferred VIN index writes (see _schedule_vin_index_save)
+        self._vin_index_dirty = False
+        self._vin_index_saved_at = 0.0
+        self._flush_timer = None
+        _open_stores.add(self)
+    
+    def invalidate(self):
+        """Drop cached listings so the next read reloads them from disk (after external edits)."""
+        with self._lock:
+            self._listings_cache = None
+            self.version += 1
+    
+    def _cache_listing(self, listing):
+        """Record a just-written listing in the cache, if the cache has been loaded."""
+        if self._listings_cache is not None:
+            self._listings_cache[listing['id']] = listing
+    
+    def _read_listing_file(self, listing_file, target_version, listing_data=None):
+        """
+        Load a listing file, running JIT migration first only if it is behind target_version.
+        
+        listing_data may be passed in when the file has already been parsed.
+        """
+        if listing_data is None:
+            listing_data = json_utils.load_file(listing_file)
+        
+        if listing_data.get('schema_version', 0) < target_version:
+            if not self.migrator.migrate_file_jit(Path(listing_file)):
+                logger.warning(f"JIT migration failed for {listing_file}")
+            listing_data = json_utils.load_file(listing_file)
+        
+        # Ensure comments field exists for backward compatibility
+        if 'comments' not in listing_data:
+            listing_data['comments'] = ''
+        # Every listing carries its numeric sort key, even if the file was edited by hand
+        if 'price_value' not in listing_data:
+            listing_data['price_value'] = parse_price(listing_data.get('data', {}).get('price'))
+        return listing_data
     
     def _load_vin_index(self):
         """Load VIN to file ID mapping."""
@@ -41,20 +135,65 @@ class Store:
                 if not self.migrator.migrate_file_jit(self.vin_index_file):
                     logger.error("JIT migration failed for VIN index")
                 
-                with open(self.vin_index_file, 'r') as f:
-                    index_data = json.load(f)
+                index_data = json_utils.load_file(self.vin_index_file)
                 
                 # Handle schema-versioned structure
                 if 'vin_mappings' in index_data:
-                    return index_data['vin_mappings']
+                    vin_index = index_data['vin_mappings']
                 else:
                     # Fallback for old structure
-                    return {k: v for k, v in index_data.items() if k != 'schema_version'}
+                    vin_index = {k: v for k, v in index_data.items() if k != 'schema_version'}
+                
+                self._index_listings_newer_than_index(vin_index)
+                return vin_index
             except Exception as e:
                 logger.error(f"Error loading VIN index: {e}")
                 return {}
         return {}
     
+    def _index_listings_newer_than_index(self, vin_index):
+        """Add VINs of listings written after the index was last saved (e.g. before a crash)."""
+        index_mtime = self.vin_index_file.stat().st_mtime_ns
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json') or not entry.is_file():
+                    continue
+                # Equal mtimes are rechecked - coarse filesystem clocks can stamp both in one tick
+                if entry.stat().st_mtime_ns < index_mtime:
+                    continue
+                try:
+                    listing = json_utils.load_file(entry.path)
+                    vin = listing.get('data', {}).get('vin')
+                    if vin and vin not in vin_index:
+                        vin_index[vin] = listing['id']
+                        logger.warning(f"Recovered unsaved VIN index entry {vin} -> {listing['id']}")
+                except Exception as e:
+                    logger.error(f"Error reading listing file {entry.path}: {e}")
+    
+    def _schedule_vin_index_save(self):
+        """
+        Save the VIN index now, or defer it if it was saved within the flush interval.
+        
+        Deferred changes are written by a timer, by flush_vin_index(), or at exit.
+        """
+        if time.monotonic() - self._vin_index_saved_at >= VIN_INDEX_FLUSH_INTERVAL:
+            self._save_vin_index()
+            return
+        
+        self._vin_index_dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(VIN_INDEX_FLUSH_INTERVAL, self.flush_vin_index)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    @_synchronized
+    def flush_vin_index(self):
+        """Write any deferred VIN index changes to disk."""
+        self._flush_timer = None
+        # Nothing to persist into if the data directory has been removed
+        if self._vin_index_dirty and self.data_dir.exists():
+            self._save_vin_index()
+    
     def _save_vin_index(self):
         """Save VIN to file ID mapping."""
         try:
@@ -68,11 +207,14 @@ class Store:
                 'vin_mappings': self.vin_index
             }
             
-            with open(self.vin_index_file, 'w') as f:
-                json.dump(index_data, f, indent=2)
+            # Machine-only file - compact output keeps rewrites and loads small
+            json_utils.dump_file(index_data, self.vin_index_file, indent=False)
+            self._vin_index_dirty = False
+            self._vin_index_saved_at = time.monotonic()
         except Exception as e:
             logger.error(f"Error saving VIN index: {e}")
     
+    @_synchronized
     def add_listing(self, listing_data):
         """
         Add or update a listing in storage (upsert operation).
@@ -103,10 +245,17 @@ class Store:
         vin = listing_data['vin']
         current_time = datetime.now().isoformat()
         
+        # Fields migrations would add, so the file is born at the current schema
+        # (a store test fails if a migration adds a field that is not set here)
+        if 'performance_package' not in listing_data:
+            listing_data = {**listing_data, 'performance_package': None}
+        
         # Add metadata, initialize comments field, and set date tracking
         listing_with_metadata = {
+            'schema_version': self.migrator.get_current_schema_version(),
             'id': listing_id,
             'data': listing_data,
+            'price_value': parse_price(listing_data.get('price')),  # Numeric sort key
             'comments': '',  # Initialize with empty comments
             'created_date': current_time,
             'last_modified_date': current_time,
@@ -119,12 +268,13 @@ class Store:
         try:
             # Ensure data directory exists before saving
             self.data_dir.mkdir(parents=True, exist_ok=True)
-            with open(listing_file, 'w', encoding='utf-8') as f:
-                json.dump(listing_with_metadata, f, indent=2, ensure_ascii=False)
+            json_utils.dump_file(listing_with_metadata, listing_file)
             
             # Update VIN index
             self.vin_index[vin] = listing_id
-            self._save_vin_index()
+            self._schedule_vin_index_save()
+            self._cache_listing(listing_with_metadata)
+            self.version += 1
             
             logger.info(f"Saved new listing with ID {listing_id} and VIN {vin}")
             return {
@@ -145,9 +295,9 @@ class Store:
         current_time = datetime.now().isoformat()
         
         try:
-            # Load existing listing
-            with open(listing_file, 'r', encoding='utf-8') as f:
-                existing_listing = json.load(f)
+            # Load existing listing (migrated first if it predates the current schema)
+            target_version = self.migrator.get_current_schema_version()
+            existing_listing = self._read_listing_file(listing_file, target_version)
             
             existing_data = existing_listing['data']
             
@@ -175,8 +325,10 @@ class Store:
             
             # Update the listing (preserve comments field and date tracking)
             updated_listing = {
+                'schema_version': target_version,
                 'id': listing_id,
                 'data': merged_data,
+                'price_value': parse_price(merged_data.get('price')),
                 'comments': existing_listing.get('comments', ''),  # Preserve existing comments
                 'created_date': created_date,
                 'last_modified_date': last_modified_date,
@@ -185,8 +337,9 @@ class Store:
             }
             
             # Save updated listing
-            with open(listing_file, 'w', encoding='utf-8') as f:
-                json.dump(updated_listing, f, indent=2, ensure_ascii=False)
+            json_utils.dump_file(updated_listing, listing_file)
+            self._cache_listing(updated_listing)
+            self.version += 1
             
             if has_meaningful_changes:
                 change_summary = format_change_summary(comparison['changes'])
@@ -214,22 +367,49 @@ class Store:
             logger.error(f"Error updating listing {listing_id}: {e}")
             raise
     
+    @_synchronized
     def get_all_listings(self):
-        """Retrieve all listings."""
-        listings = []
+        """
+        Retrieve all listings.
+        
+        Listings are read from disk once and then served from memory. Each call
+        returns shallow copies, so callers may add keys without touching the cache.
+        """
+        if self._listings_cache is None:
+            self._listings_cache = self._load_all_listings()
+        
+        return [dict(listing) for listing in self._listings_cache.values()]
+    
+    @_synchronized
+    def iter_all_listings(self):
+        """
+        Iterate over all listings without copying them.
+        
+        The listings are the cached dicts themselves, so this is for read-only
+        callers such as exports; the set of listings is fixed when this is called.
+        """
+        if self._listings_cache is None:
+            self._listings_cache = self._load_all_listings()
+        
+        return iter(list(self._listings_cache.values()))
+    
+    def _load_all_listings(self):
+        """Read every listing file from disk into a dict keyed by listing ID."""
+        listings = {}
+        target_version = self.migrator.get_current_schema_version()
+        with os.scandir(self.data_dir) as entries:
+            listing_files = [entry.path for entry in entries if entry.name.endswith('.json') and entry.is_file()]
+        
+        # Files are independent, so overlap their reads; any migrations then run one at a time below
+        with ThreadPoolExecutor(max_workers=LISTING_LOAD_WORKERS) as executor:
+            parsed_files = list(executor.map(_load_json_or_error, listing_files))
         
-        for listing_file in self.data_dir.glob("*.json"):
+        for listing_file, parsed in zip(listing_files, parsed_files):
             try:
-                # Check if JIT migration is needed
-                if not self.migrator.migrate_file_jit(listing_file):
-                    logger.warning(f"JIT migration failed for {listing_file}")
-                
-                with open(listing_file, 'r', encoding='utf-8') as f:
-                    listing_data = json.load(f)
-                    # Ensure comments field exists for backward compatibility
-                    if 'comments' not in listing_data:
-                        listing_data['comments'] = ''
-                    listings.append(listing_data)
+                if isinstance(parsed, Exception):
+                    raise parsed
+                listing_data = self._read_listing_file(listing_file, target_version, parsed)
+                listings[listing_data.get('id', os.path.basename(listing_file)[:-len('.json')])] = listing_data
             except Exception as e:
                 logger.error(f"Error reading listing file {listing_file}: {e}")
                 continue
@@ -237,31 +417,28 @@ class Store:
         return listings
     
     def get_listing_count(self):
-        """Get total number of stored listings."""
-        return len(list(self.data_dir.glob("*.json")))
+        """Get total number of stored listings (every stored listing has exactly one VIN index entry)."""
+        return len(self.vin_index)
     
+    @_synchronized
     def get_listing_by_id(self, listing_id):
         """Retrieve a single listing by ID."""
+        if self._listings_cache is not None:
+            listing = self._listings_cache.get(listing_id)
+            return dict(listing) if listing else None
+        
         listing_file = self.data_dir / f"{listing_id}.json"
         
         if not listing_file.exists():
             return None
         
         try:
-            # Check if JIT migration is needed
-            if not self.migrator.migrate_file_jit(listing_file):
-                logger.warning(f"JIT migration failed for {listing_file}")
-            
-            with open(listing_file, 'r', encoding='utf-8') as f:
-                listing_data = json.load(f)
-                # Ensure comments field exists for backward compatibility
-                if 'comments' not in listing_data:
-                    listing_data['comments'] = ''
-                return listing_data
+            return self._read_listing_file(listing_file, self.migrator.get_current_schema_version())
         except Exception as e:
             logger.error(f"Error reading listing file {listing_file}: {e}")
             return None
     
+    @_synchronized
     def delete_listing(self, listing_id):
         """
         Soft delete a listing by moving it to deleted folder and removing from index.
@@ -282,8 +459,7 @@ class Store:
         
         try:
             # Load listing data to get VIN and other info
-            with open(listing_file, 'r', encoding='utf-8') as f:
-                listing_data = json.load(f)
+            listing_data = json_utils.load_file(listing_file)
             
             vin = listing_data.get('data', {}).get('vin')
             current_time = datetime.now().isoformat()
@@ -299,11 +475,13 @@ class Store:
             
             # Move file to deleted directory
             deleted_file = deleted_dir / f"{listing_id}.json"
-            with open(deleted_file, 'w', encoding='utf-8') as f:
-                json.dump(listing_data, f, indent=2, ensure_ascii=False)
+            json_utils.dump_file(listing_data, deleted_file)
             
             # Remove original file
             listing_file.unlink()
+            if self._listings_cache is not None:
+                self._listings_cache.pop(listing_id, None)
+            self.version += 1
             
             # Remove from VIN index if VIN exists
             if vin and vin in self.vin_index:
@@ -325,6 +503,7 @@ class Store:
                 'message': f'Error deleting listing: {str(e)}'
             }
     
+    @_synchronized
     def update_comments(self, listing_id, comments):
         """
         Update the comments field for a listing.
@@ -346,16 +525,16 @@ class Store:
             }
         
         try:
-            # Load existing listing
-            with open(listing_file, 'r', encoding='utf-8') as f:
-                listing_data = json.load(f)
+            # Load existing listing the same way reads do, so the cached copy has every derived field
+            listing_data = self._read_listing_file(listing_file, self.migrator.get_current_schema_version())
             
             # Update comments field
             listing_data['comments'] = comments
             
             # Save back to file
-            with open(listing_file, 'w', encoding='utf-8') as f:
-                json.dump(listing_data, f, indent=2, ensure_ascii=False)
+            json_utils.dump_file(listing_data, listing_file)
+            self._cache_listing(listing_data)
+            self.version += 1
             
             logger.info(f"Updated comments for listing {listing_id}")
             
@@ -371,6 +550,7 @@ class Store:
                 'message': f'Error updating comments: {str(e)}'
             }
     
+    @_synchronized
     def update_editable_fields(self, listing_id, fields):
         """
         Update editable fields for a listing.
@@ -400,9 +580,8 @@ class Store:
                     'message': 'Failed to migrate listing file'
                 }
             
-            # Load existing listing
-            with open(listing_file, 'r', encoding='utf-8') as f:
-                listing_data = json.load(f)
+            # Load existing listing the same way reads do, so the cached copy has every derived field
+            listing_data = self._read_listing_file(listing_file, self.migrator.get_current_schema_version())
             
             # Update editable fields in the data section
             changes_made = []
@@ -418,8 +597,9 @@ class Store:
                 listing_data['last_modified_date'] = datetime.now().isoformat()
                 
                 # Save back to file
-                with open(listing_file, 'w', encoding='utf-8') as f:
-                    json.dump(listing_data, f, indent=2, ensure_ascii=False)
+                json_utils.dump_file(listing_data, listing_file)
+                self._cache_listing(listing_data)
+                self.version += 1
                 
                 logger.info(f"Updated editable fields for listing {listing_id}: {', '.join(changes_made)}")
                 
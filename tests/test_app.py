@@ -179,6 +179,29 @@ class TestListingsPostEndpoint:
         data = json.loads(response.data)
         assert 'Missing required fields' in data['error']
     
+    def test_oversized_payload_rejected(self, client, sample_listing_payload):
+        """Test that oversized listing payloads are rejected with 413."""
+        payload = sample_listing_payload.copy()
+        payload['title'] = 'x' * (70 * 1024)
+        
+        response = client.post('/listings',
+                             data=json.dumps(payload),
+                             content_type='application/json')
+        
+        assert response.status_code == 413
+        data = json.loads(response.data)
+        assert data['error'] == 'Payload too large'
+    
+    def test_malformed_json_rejected(self, client):
+        """Test that a malformed JSON body returns 400 rather than a server error."""
+        response = client.post('/listings',
+                             data='{"vin": ',
+                             content_type='application/json')
+        
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert data['error'] == 'No JSON data provided'
+    
     def test_optional_fields_accepted(self, client):
         """Test that optional fields (title, location, distance) are stored."""
         payload = {
@@ -281,7 +304,19 @@ class TestIndexEndpoint:
         assert response.status_code == 200
         assert b'No listings yet' in response.data
         assert b'Use the browser extension' in response.data
-    
+
+    def test_index_render_error_returns_500(self, client, monkeypatch):
+        """Test a page that fails to render returns an error instead of a truncated page."""
+        import routes.listings
+
+        def failing_render(*args, **kwargs):
+            raise RuntimeError('template exploded')
+
+        monkeypatch.setattr(routes.listings, 'render_template', failing_render)
+        response = client.get('/')
+        assert response.status_code == 500
+        assert b'Error loading listings' in response.data
+
     def test_index_with_listings(self, client, sample_listing_payload):
         """Test index page displays listings."""
         # Add a listing first
@@ -327,6 +362,72 @@ class TestIndexEndpoint:
         response = client.get('/')
         assert b'2 listings collected' in response.data
 
+    def test_index_sort_orders(self, client, sample_listing_payload):
+        """Test every sort order renders, including listings with unparseable fields."""
+        client.post('/listings',
+                   data=json.dumps(sample_listing_payload),
+                   content_type='application/json')
+        incomplete = dict(sample_listing_payload, vin='WVWZZZ1JZ1W654321', price='$30,000', mileage='N/A')
+        client.post('/listings',
+                   data=json.dumps(incomplete),
+                   content_type='application/json')
+
+        for sort_by in ('price', 'desirability', 'last_seen_asc'):
+            response = client.get(f'/?sort={sort_by}')
+            assert response.status_code == 200
+            assert b'2 listings collected' in response.data
+
+    def test_index_unknown_sort_falls_back_to_price(self, client, sample_listing_payload):
+        """Test an unknown sort value serves the price page under the same ETag."""
+        client.post('/listings',
+                   data=json.dumps(sample_listing_payload),
+                   content_type='application/json')
+
+        price = client.get('/?sort=price')
+        unknown = client.get('/?sort=bogus')
+
+        assert unknown.status_code == 200
+        assert unknown.headers['ETag'] == price.headers['ETag']
+        assert unknown.data == price.data
+
+    def test_index_reflects_listing_updates(self, client, sample_listing_payload):
+        """Test that a cached index page is refreshed after a listing changes."""
+        client.post('/listings',
+                   data=json.dumps(sample_listing_payload),
+                   content_type='application/json')
+        
+        response = client.get('/')
+        assert b'$25,000' in response.data
+        
+        updated_listing = sample_listing_payload.copy()
+        updated_listing['price'] = '$23,500'
+        client.post('/listings',
+                   data=json.dumps(updated_listing),
+                   content_type='application/json')
+        
+        response = client.get('/')
+        assert b'$23,500' in response.data
+        assert b'$25,000' not in response.data
+    
+    def test_index_conditional_get(self, client, sample_listing_payload):
+        """Test that an unchanged index page answers If-None-Match with 304."""
+        response = client.get('/')
+        assert b'No listings yet' in response.data
+        etag = response.headers['ETag']
+        assert response.headers['Cache-Control'] == 'no-cache'
+        
+        response = client.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        # A new listing changes the page, so the old tag no longer matches
+        client.post('/listings',
+                   data=json.dumps(sample_listing_payload),
+                   content_type='application/json')
+        response = client.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
 
 class TestIndividualListingPage:
     """Test individual listing detail page."""
@@ -365,7 +466,17 @@ class TestIndividualListingPage:
         response = client.get(f'/listing/{fake_id}')
         assert response.status_code == 404
         assert b'Listing not found' in response.data
-    
+
+    def test_malformed_listing_id_rejected_by_router(self, client):
+        """Test malformed listing IDs 404 at routing time without reaching the view."""
+        for bad_id in ('short', '..%2F..%2Fconfig', 'x' * 65):
+            response = client.get(f'/listing/{bad_id}')
+            assert response.status_code == 404
+            assert b'Listing not found' not in response.data
+
+            response = client.delete(f'/listings/{bad_id}')
+            assert response.status_code == 404
+
     def test_listing_links_from_index(self, client, sample_listing_payload):
         """Test that index page contains links to individual listings."""
         # Add a listing
@@ -717,6 +828,26 @@ class TestCSVExport:
         assert sample_listing_payload['vin'] in vins_in_export
         assert second_listing['vin'] in vins_in_export
     
+    def test_csv_export_conditional_get(self, client, sample_listing_payload):
+        """Test that an unchanged export answers If-None-Match with 304."""
+        response = client.get('/listings/export.csv')
+        first_export = response.data
+        etag = response.headers['ETag']
+        
+        response = client.get('/listings/export.csv', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        # Without a validator the cached export is served again
+        response = client.get('/listings/export.csv')
+        assert response.data == first_export
+        
+        client.post('/listings',
+                   data=json.dumps(sample_listing_payload),
+                   content_type='application/json')
+        response = client.get('/listings/export.csv', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert sample_listing_payload['vin'].encode() in response.data
+    
     def test_csv_export_missing_fields(self, client):
         """Test CSV export with listings missing some fields."""
         # Add a listing with missing optional fields
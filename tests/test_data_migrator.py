@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Tests for the DataMigrator backup/restore system in migrations.py.
+"""
+
+import pytest
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+from pathlib import Path
+
+# migrations.py is shadowed by the migrations/ package, so load it from its path
+_spec = importlib.util.spec_from_file_location(
+    'data_migrations', Path(__file__).resolve().parent.parent / 'migrations.py')
+data_migrations = importlib.util.module_from_spec(_spec)
+sys.modules['data_migrations'] = data_migrations
+_spec.loader.exec_module(data_migrations)
+DataMigrator = data_migrations.DataMigrator
+
+
+@pytest.fixture
+def migrator(tmp_path):
+    """A DataMigrator over a small data directory."""
+    data_dir = tmp_path / "data"
+    (data_dir / "indices").mkdir(parents=True)
+    (data_dir / "listing1.json").write_text('{"id": "listing1"}')
+    (data_dir / "indices" / "vin_to_id.json").write_text('{"VIN1": "listing1"}')
+    return DataMigrator(str(data_dir), str(tmp_path / "backups"))
+
+
+def python_only(migrator, monkeypatch):
+    """Force restores through the portable tarfile path."""
+    monkeypatch.setattr(migrator, '_external_decompress_command', lambda is_zstd: None)
+
+
+def external_gzip(migrator, monkeypatch):
+    """Force restores through the external tools path, with gzip standing in for pigz."""
+    if shutil.which('gzip') is None or shutil.which('tar') is None:
+        pytest.skip("gzip and tar are required for the external restore path")
+    monkeypatch.setattr(migrator, '_external_decompress_command', lambda is_zstd: ['gzip', '-dc'])
+
+
+def write_backup(migrator, name, members):
+    """Write a .tar.gz backup holding the given (TarInfo, bytes) members."""
+    backup_path = migrator.backup_dir / f"data_backup_{name}.tar.gz"
+    with tarfile.open(backup_path, 'w:gz') as tar:
+        for info, content in members:
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return backup_path
+
+
+class TestBackupRestore:
+    """Test backups round-trip through every restore path."""
+
+    @pytest.mark.parametrize('restore_path', [python_only, external_gzip])
+    def test_gzip_round_trip(self, migrator, monkeypatch, restore_path):
+        """Test a gzip backup restores the data directory as it was."""
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        backup_path = migrator.create_backup("round_trip")
+        assert backup_path.name.endswith('.tar.gz')
+
+        (migrator.data_dir / "listing1.json").write_text('{"id": "changed"}')
+        (migrator.data_dir / "listing2.json").write_text('{"id": "listing2"}')
+        restore_path(migrator, monkeypatch)
+
+        assert migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+        assert not (migrator.data_dir / "listing2.json").exists()
+        assert (migrator.data_dir / "indices" / "vin_to_id.json").read_text() == '{"VIN1": "listing1"}'
+
+    def test_zstd_restore_with_cli(self, migrator, monkeypatch):
+        """Test a zstd backup restores through the zstd tool without the zstandard module."""
+        zstd = shutil.which('zstd')
+        if zstd is None:
+            pytest.skip("zstd tool not installed")
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        tar_path = migrator.backup_dir / "data_backup_zstd.tar"
+        with tarfile.open(tar_path, 'w') as tar:
+            tar.add(migrator.data_dir, arcname="data")
+        subprocess.run([zstd, '-q', '--rm', str(tar_path)], check=True)
+        backup_path = tar_path.with_name(tar_path.name + '.zst')
+
+        (migrator.data_dir / "listing1.json").write_text('{"id": "changed"}')
+
+        assert migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+    def test_zstd_restore_without_zstandard_or_cli(self, migrator, monkeypatch):
+        """Test a zstd backup is refused up front when it cannot be decompressed."""
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        monkeypatch.setattr(migrator, '_external_decompress_command', lambda is_zstd: None)
+        backup_path = migrator.backup_dir / "data_backup_zstd.tar.zst"
+        backup_path.write_bytes(b'')
+
+        assert not migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+    @pytest.mark.parametrize('restore_path', [python_only, external_gzip])
+    def test_escaping_member_rejected(self, migrator, monkeypatch, restore_path):
+        """Test a member that climbs out of data/ is never written."""
+        backup_path = write_backup(migrator, "escape", [
+            (tarfile.TarInfo("data/listing1.json"), b'{"id": "restored"}'),
+            (tarfile.TarInfo("data/../escape"), b'escaped'),
+        ])
+        restore_path(migrator, monkeypatch)
+
+        assert not migrator.restore_backup(backup_path)
+        assert not (migrator.data_dir.parent / "escape").exists()
+
+    def test_escaping_member_checked_before_data_removed(self, migrator, monkeypatch):
+        """Test the external path rejects an unsafe backup without touching the data directory."""
+        backup_path = write_backup(migrator, "escape", [
+            (tarfile.TarInfo("data/../escape"), b'escaped'),
+        ])
+        external_gzip(migrator, monkeypatch)
+
+        assert not migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+    @pytest.mark.parametrize('name, linkname', [
+        ("data/link", "/etc"),
+        ("data/link", "../app.py"),
+    ])
+    def test_escaping_symlink_rejected(self, migrator, name, linkname):
+        """Test links pointing outside data/ fail the member check."""
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.SYMTYPE
+        info.linkname = linkname
+
+        with pytest.raises(data_migrations.MigrationError):
+            migrator._check_backup_member(info)
+
+    def test_member_outside_data_rejected(self, migrator):
+        """Test members outside the backup's data/ directory fail the member check."""
+        with pytest.raises(data_migrations.MigrationError):
+            migrator._check_backup_member(tarfile.TarInfo("other/listing.json"))
+
+
+class TestExternalToolFallback:
+    """Test restores fall back to Python when the external tools are missing or fail."""
+
+    def test_missing_tools_use_python(self, migrator, monkeypatch):
+        """Test no external command is chosen without the tools, and the restore still works."""
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        backup_path = migrator.create_backup("no_tools")
+        (migrator.data_dir / "listing1.json").write_text('{"id": "changed"}')
+        monkeypatch.setattr(data_migrations.shutil, 'which', lambda name: None)
+
+        assert migrator._external_decompress_command(False) is None
+        assert migrator._external_decompress_command(True) is None
+        assert migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+    @pytest.mark.parametrize('tool_code', [
+        # Dies before writing anything
+        "import sys; sys.exit(1)",
+        # Writes the whole archive, then reports failure
+        "import gzip, sys; sys.stdout.buffer.write(gzip.open(sys.argv[1]).read()); sys.exit(1)",
+    ])
+    def test_failing_tool_falls_back_to_python(self, migrator, monkeypatch, tool_code):
+        """Test a decompress tool exiting non-zero leads to a Python restore."""
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        backup_path = migrator.create_backup("failing_tool")
+        (migrator.data_dir / "listing1.json").write_text('{"id": "changed"}')
+        monkeypatch.setattr(migrator, '_external_decompress_command',
+                            lambda is_zstd: [sys.executable, '-c', tool_code])
+
+        assert migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+    def test_failing_extract_retries_in_python(self, migrator, monkeypatch):
+        """Test a failed tar extraction is cleaned up and retried in Python."""
+        external_gzip(migrator, monkeypatch)
+        monkeypatch.setattr(data_migrations, 'zstandard', None)
+        backup_path = migrator.create_backup("failing_tar")
+        (migrator.data_dir / "listing1.json").write_text('{"id": "changed"}')
+        original_run = data_migrations.subprocess.run
+        monkeypatch.setattr(data_migrations.subprocess, 'run',
+                            lambda command, **kwargs: original_run(command + ['--no-such-tar-option'], **kwargs))
+
+        assert migrator.restore_backup(backup_path)
+        assert (migrator.data_dir / "listing1.json").read_text() == '{"id": "listing1"}'
+
+
+class TestUrlMigration:
+    """Test the url -> urls data migration."""
+
+    @staticmethod
+    def write_listings(data_dir):
+        """Write a mix of old-format, migrated and url-less listings."""
+        data_dir.mkdir(parents=True)
+        for i, url in enumerate(["https://www.cargurus.com/listing/1",
+                                 "https://AUTOTRADER.com/cars/2",
+                                 "https://www.cars.com/vehicledetail/3",
+                                 "https://example.com/4"]):
+            (data_dir / f"old{i}.json").write_text(
+                json.dumps({"id": f"old{i}", "data": {"url": url, "price": "$25,000", "note": "café"}}))
+        (data_dir / "migrated.json").write_text(json.dumps(
+            {"id": "migrated", "data": {"urls": {"cars": "https://cars.com/5"}, "last_updated_site": "cars"}}))
+        (data_dir / "no_url.json").write_text(json.dumps({"id": "no_url", "data": {}}))
+
+    def test_thread_and_process_pools_write_identical_files(self, tmp_path, monkeypatch):
+        """Test the process pool used for large sets writes exactly what the thread pool does."""
+        outputs = {}
+        process_pools = []
+        real_process_pool = data_migrations.ProcessPoolExecutor
+        monkeypatch.setattr(data_migrations, 'ProcessPoolExecutor',
+                            lambda **kwargs: process_pools.append(kwargs) or real_process_pool(**kwargs))
+        for threshold in (data_migrations.PROCESS_POOL_THRESHOLD, 1):
+            data_dir = tmp_path / f"threshold_{threshold}" / "data"
+            self.write_listings(data_dir)
+            monkeypatch.setattr(data_migrations, 'PROCESS_POOL_THRESHOLD', threshold)
+
+            assert data_migrations.migration_url_to_multi_site(data_dir)
+            outputs[threshold] = {path.name: path.read_bytes() for path in data_dir.glob("*.json")}
+
+        assert len(process_pools) == 1
+        thread_output, process_output = outputs.values()
+        assert process_output == thread_output
+        # Written indented, like the Store and the schema migrations write listings
+        assert thread_output["old0.json"] == json.dumps(
+            json.loads(thread_output["old0.json"]), indent=2, ensure_ascii=False).encode('utf-8')
+        migrated = json.loads(thread_output["old0.json"])["data"]
+        assert migrated["urls"] == {"cargurus": "https://www.cargurus.com/listing/1"}
+        assert migrated["sites_seen"] == ["cargurus"]
+        assert "url" not in migrated
+        assert json.loads(thread_output["old1.json"])["data"]["last_updated_site"] == "autotrader"
+        assert json.loads(thread_output["old3.json"])["data"]["last_updated_site"] == "unknown"
+
+    def test_syncs_only_rewritten_files(self, tmp_path, monkeypatch):
+        """Test the migration fsyncs the listings it rewrote and the data directory, not the whole host."""
+        data_dir = tmp_path / "data"
+        self.write_listings(data_dir)
+        synced = []
+        real_fsync = os.fsync
+        monkeypatch.setattr(data_migrations.os, 'fsync',
+                            lambda fd: synced.append(os.fstat(fd).st_ino) or real_fsync(fd))
+        monkeypatch.setattr(data_migrations.os, 'sync', lambda: pytest.fail("os.sync() flushes every filesystem"))
+
+        assert data_migrations.migration_url_to_multi_site(data_dir)
+        expected = [data_dir / f"old{i}.json" for i in range(4)] + [data_dir]
+        assert sorted(synced) == sorted(path.stat().st_ino for path in expected)
+
+    def test_old_format_detected_whatever_the_json_spacing(self, tmp_path):
+        """Test a listing still holding 'url' is migrated even if "urls" appears as a value."""
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        listing_path = data_dir / "old.json"
+        listing_path.write_text(json.dumps(
+            {"id": "old", "data": {"url": "https://www.cargurus.com/1", "note": "urls"}}, separators=(',', '\t:')))
+
+        assert data_migrations.migration_url_to_multi_site(data_dir)
+        data = json.loads(listing_path.read_text())["data"]
+        assert data["urls"] == {"cargurus": "https://www.cargurus.com/1"}
+        assert "url" not in data
@@ -6,7 +6,7 @@ Tests for desirability calculation module.
 import pytest
 from desirability import (
     normalize_price, normalize_mileage, normalize_year,
-    calculate_desirability_score, add_desirability_scores
+    calculate_desirability_score, add_desirability_scores, rank_listings
 )
 
 
@@ -151,6 +151,60 @@ class TestDesirabilityCalculation:
         assert max(scores) == listings_with_scores[0]['desirability_score']
         assert min(scores) == listings_with_scores[2]['desirability_score']
     
+    def test_add_desirability_scores_matches_single_scoring(self, sample_listings):
+        """Test that batch scoring gives the same result as scoring each listing alone."""
+        invalid_price = {
+            'id': '4',
+            'data': {'price': 'Call for price', 'mileage': '40,000', 'year': '2021'}
+        }
+        all_listings = sample_listings + [invalid_price]
+        expected = [calculate_desirability_score(l, all_listings) for l in all_listings]
+        
+        add_desirability_scores(all_listings)
+        
+        assert [l['desirability_score'] for l in all_listings] == expected
+    
+    def test_add_desirability_scores_no_spread(self):
+        """Test that identical or single listings score a neutral 50 (incomplete ones 0)."""
+        single = [{'id': '1', 'data': {'price': '$25,000', 'mileage': '40,000', 'year': '2020'}}]
+        assert add_desirability_scores(single)[0]['desirability_score'] == 50.0
+        
+        identical = [
+            {'id': '1', 'data': {'price': '$25,000', 'mileage': '40,000', 'year': '2020'}},
+            {'id': '2', 'data': {'price': '$25,000', 'mileage': '40,000', 'year': '2020'}},
+            {'id': '3', 'data': {'price': '$25,000', 'year': '2020'}}  # Missing mileage
+        ]
+        scores = [l['desirability_score'] for l in add_desirability_scores(identical)]
+        assert scores == [50.0, 50.0, 0.0]
+    
+    def test_add_desirability_scores_flags_incomplete(self):
+        """Test that flag_incomplete marks listings missing required fields while scoring."""
+        listings = [
+            {'id': '1', 'data': {'price': '$25,000', 'mileage': '40,000', 'year': '2020'}},
+            {'id': '2', 'data': {'price': '$30,000', 'mileage': '', 'year': '2021'}}
+        ]
+        add_desirability_scores(listings, flag_incomplete=True)
+
+        assert 'desirability_warning' not in listings[0]
+        assert listings[1]['desirability_warning'] == 'Missing: mileage'
+        assert all('desirability_score' in l for l in listings)
+
+        unflagged = [{'id': '3', 'data': {'price': '$25,000'}}]
+        add_desirability_scores(unflagged)
+        assert 'desirability_warning' not in unflagged[0]
+
+    def test_rank_listings(self, sample_listings):
+        """Test ranking returns listings best-first and honours k."""
+        ranked = rank_listings(list(sample_listings))
+        scores = [l['desirability_score'] for l in ranked]
+        
+        assert scores == sorted(scores, reverse=True)
+        assert ranked[0]['id'] == '1'
+        
+        top_two = rank_listings(list(sample_listings), k=2)
+        assert [l['id'] for l in top_two] == [l['id'] for l in ranked[:2]]
+        assert rank_listings([], k=3) == []
+    
     def test_add_desirability_scores_empty_list(self):
         """Test adding scores to empty list."""
         result = add_desirability_scores([])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Unit tests for json_utils module.
+Tests file round-trips and output format with or without orjson.
+"""
+
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+import json_utils
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for JSON files."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+class TestJsonFiles:
+    """Test JSON file helpers."""
+    
+    def test_round_trip(self, temp_dir):
+        """Test that data written to a file reads back unchanged."""
+        listing = {
+            'id': 'abc',
+            'data': {'price': '$25,000', 'location': 'Zürich', 'performance_package': None},
+            'price_value': 25000,
+            'comments': 'Line one\nLine two'
+        }
+        path = temp_dir / 'listing.json'
+        
+        json_utils.dump_file(listing, path)
+        
+        assert json_utils.load_file(path) == listing
+    
+    def test_indented_utf8_output(self, temp_dir):
+        """Test that files are 2-space indented UTF-8 without escaping non-ASCII text."""
+        path = temp_dir / 'listing.json'
+        
+        json_utils.dump_file({'location': 'Zürich'}, path)
+        
+        assert path.read_bytes() == '{\n  "location": "Zürich"\n}'.encode('utf-8')
+    
+    def test_compact_output(self):
+        """Test that indent=False produces compact JSON."""
+        assert json_utils.dumps({'a': [1, 2]}, indent=False) == b'{"a":[1,2]}'
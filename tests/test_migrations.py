@@ -6,12 +6,15 @@ Tests for the data migration system.
 import pytest
 import tempfile
 import json
+import os
 import shutil
 from pathlib import Path
 from schema_migrations import SchemaMigrator
 from migrations.v001_url_to_multi_site import migrate as migrate_v001
 from migrations.v002_add_schema_versioning import migrate as migrate_v002
+from migrations.v003_add_date_tracking import parse_app_log, prepare as prepare_v003
 from migrations.v004_add_performance_package import migrate as migrate_v004
+from migrations.v005_add_price_value import migrate as migrate_v005
 
 
 class TestSchemaMigrator:
@@ -56,6 +59,130 @@ class TestSchemaMigrator:
         version = migrator.get_file_schema_version(test_file)
         assert version == 2
     
+    def test_available_migrations_cached_until_dir_changes(self, temp_dirs):
+        """Test migration discovery is reused but picks up newly added files."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v002_first.py").write_text("def migrate(d): return d\n")
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+
+        assert migrator.get_available_migrations() == [2]
+        assert migrator.get_pending_migrations(0) == [2]
+
+        (migrations_dir / "v003_second.py").write_text("def migrate(d): return d\n")
+        os.utime(migrations_dir, ns=(0, migrations_dir.stat().st_mtime_ns + 1))
+
+        assert migrator.get_available_migrations() == [2, 3]
+        assert migrator.get_current_schema_version() == 3
+        assert migrator.get_pending_migrations(2) == [3]
+
+    def test_preflight_loads_each_migration_once(self, temp_dirs, monkeypatch):
+        """Test a preflight run loads each migration module once for all files."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v002_mark.py").write_text(
+            "def migrate(d):\n"
+            "    d['marked'] = True\n"
+            "    return d\n"
+        )
+        (data_dir / "indices").mkdir()
+        (data_dir / "indices" / "vin_to_id.json").write_text('{}')
+        for i in range(3):
+            (data_dir / f"listing{i}.json").write_text(json.dumps({"id": f"listing{i}", "data": {}}))
+
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+        loaded = []
+        original_load = migrator.load_migration
+        monkeypatch.setattr(migrator, 'load_migration', lambda v: loaded.append(v) or original_load(v))
+
+        assert migrator.run_preflight_migration()
+        assert loaded == [2]
+        for i in range(3):
+            migrated = json.loads((data_dir / f"listing{i}.json").read_text())
+            assert migrated["marked"] is True
+            assert migrated["schema_version"] == 2
+
+    @pytest.mark.parametrize('index_version', [None, 3])
+    def test_preflight_prepares_pending_migrations_once(self, temp_dirs, index_version):
+        """Test prepare() runs once before any file is migrated, even if only listings lag behind the index."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v003_dates.py").write_text(
+            "calls = []\n"
+            "def prepare(migration_context):\n"
+            "    calls.append(migration_context['data_dir'])\n"
+            "    migration_context['historical_dates'] = {'listing0': '2025-07-14T10:00:00'}\n"
+            "def migrate(d, migration_context):\n"
+            "    d['created_date'] = migration_context['historical_dates'].get(d.get('id'))\n"
+            "    return d\n"
+        )
+        (migrations_dir / "v004_mark.py").write_text("def migrate(d):\n    return d\n")
+        if index_version is not None:
+            (data_dir / "indices").mkdir()
+            (data_dir / "indices" / "vin_to_id.json").write_text(
+                json.dumps({"schema_version": index_version, "vin_mappings": {}}))
+        for i in range(3):
+            (data_dir / f"listing{i}.json").write_text(json.dumps({"id": f"listing{i}", "data": {}}))
+
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+        loaded = {}
+        original_load = migrator.load_migration
+        migrator.load_migration = lambda v: loaded.setdefault(v, original_load(v))
+
+        assert migrator.run_preflight_migration()
+        assert loaded[3].calls == [data_dir]
+        assert json.loads((data_dir / "listing0.json").read_text())["created_date"] == "2025-07-14T10:00:00"
+        assert json.loads((data_dir / "listing1.json").read_text())["created_date"] is None
+
+    def test_preflight_skips_prepare_when_no_file_needs_it(self, temp_dirs):
+        """Test prepare() is not run for a migration every file has already had."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v003_dates.py").write_text(
+            "def prepare(migration_context):\n"
+            "    raise AssertionError('prepare should not run')\n"
+            "def migrate(d, migration_context):\n"
+            "    return d\n"
+        )
+        (migrations_dir / "v004_mark.py").write_text("def migrate(d):\n    return d\n")
+        (data_dir / "indices").mkdir()
+        (data_dir / "indices" / "vin_to_id.json").write_text(json.dumps({"schema_version": 3, "vin_mappings": {}}))
+        (data_dir / "listing0.json").write_text(json.dumps({"schema_version": 3, "id": "listing0", "data": {}}))
+
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+
+        assert migrator.run_preflight_migration()
+        assert migrator.get_file_schema_version(data_dir / "listing0.json") == 4
+
+    def test_preflight_keeps_store_file_layout(self, temp_dirs):
+        """Test migrated listings stay indented like Store writes them while the index is compact."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v002_mark.py").write_text("def migrate(d):\n    return d\n")
+        (data_dir / "indices").mkdir()
+        index_path = data_dir / "indices" / "vin_to_id.json"
+        index_path.write_text(json.dumps({"VIN1": "listing1"}))
+        listing_path = data_dir / "listing1.json"
+        listing_path.write_text(json.dumps({"id": "listing1", "data": {}}))
+
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+
+        assert migrator.run_preflight_migration()
+        assert "\n" in listing_path.read_text()
+        assert "\n" not in index_path.read_text()
+
+    def test_failed_preflight_leaves_index_behind(self, temp_dirs):
+        """Test the index is only marked current once every listing file has migrated."""
+        data_dir, backup_dir, migrations_dir = temp_dirs
+        (migrations_dir / "v002_mark.py").write_text("def migrate(d):\n    return d\n")
+        (data_dir / "indices").mkdir()
+        index_path = data_dir / "indices" / "vin_to_id.json"
+        index_path.write_text('{}')
+        (data_dir / "good.json").write_text(json.dumps({"id": "good", "data": {}}))
+        (data_dir / "broken.json").write_text('{not json')
+
+        migrator = SchemaMigrator(str(data_dir), str(backup_dir), str(migrations_dir))
+
+        assert not migrator.run_preflight_migration()
+        assert migrator.get_file_schema_version(index_path) == 0
+        assert migrator.get_file_schema_version(data_dir / "good.json") == 2
+        assert migrator.check_migration_needed() == (True, 0, 2)
+
     def test_migrate_file_to_version(self, temp_dirs):
         """Test migrating a file using the v002 migration function."""
         data_dir, backup_dir, migrations_dir = temp_dirs
@@ -169,6 +296,12 @@ class TestURLMigration:
         assert data1["urls"]["cargurus"] == "https://cargurus.com/listing/123"
         assert data1["last_updated_site"] == "cargurus"
     
+    def test_url_migration_keeps_original_site_order(self):
+        """Test v001 checks domains in its original order, whatever the app's site detection does."""
+        listing = {"id": "listing3", "data": {"url": "https://www.cars.com/x?ref=cargurus.com"}}
+        
+        assert migrate_v001(listing)["data"]["last_updated_site"] == "cargurus"
+    
     def test_v004_performance_package_migration(self):
         """Test v004 migration adds performance_package field."""
         # Create test listing without performance_package
@@ -221,4 +354,81 @@ class TestURLMigration:
         assert migrated_once == migrated_twice
         
         # Verify field value is preserved
-        assert migrated_twice['data']['performance_package'] is True
\ No newline at end of file
+        assert migrated_twice['data']['performance_package'] is True
+    
+    def test_v005_price_value_migration(self):
+        """Test v005 migration adds numeric price_value field."""
+        test_listing = {
+            "schema_version": 4,
+            "id": "test-id",
+            "data": {
+                "price": "$25,000",
+                "year": "2019",
+                "performance_package": None
+            }
+        }
+        
+        migrated_listing = migrate_v005(test_listing)
+        
+        assert migrated_listing['price_value'] == 25000
+        # Display price is left untouched
+        assert migrated_listing['data']['price'] == "$25,000"
+    
+    def test_v005_unparseable_price(self):
+        """Test v005 migration falls back to 0 for missing or invalid prices."""
+        assert migrate_v005({"id": "a", "data": {"price": "Call for price"}})['price_value'] == 0
+        assert migrate_v005({"id": "b", "data": {}})['price_value'] == 0
+    
+    def test_v005_migration_idempotent(self):
+        """Test that v005 migration can be run multiple times safely."""
+        test_listing = {
+            "schema_version": 4,
+            "id": "test-id",
+            "data": {"price": "$19,999"}
+        }
+        
+        migrated_once = migrate_v005(test_listing)
+        migrated_twice = migrate_v005(migrated_once)
+        
+        assert migrated_once == migrated_twice
+        assert migrated_twice['price_value'] == 19999
+    
+    def test_v003_parse_app_log(self, tmp_path):
+        """Test v003 log parsing keeps first creation and latest modified/seen dates."""
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        (tmp_path / "app.log").write_text(
+            "2025-07-14 10:00:00,123 - INFO - Saved new listing with ID abc-1 and VIN WVW12345678901234\n"
+            "2025-07-14 10:05:00,123 - INFO - Listing with VIN WVW12345678901234 already exists with ID abc-1\n"
+            "2025-07-15 11:00:00,123 - INFO - Updated listing abc-1: price changed\n"
+            "2025-07-16 09:00:00,123 - INFO - Listing with VIN WVW12345678901234 already exists with ID abc-1\n"
+            "2025-07-16 12:00:00,123 - INFO - Unrelated message\n"
+        )
+        
+        dates = parse_app_log(str(data_dir))
+        
+        assert dates == {
+            "abc-1": {
+                "created_date": "2025-07-14T10:00:00",
+                "last_modified_date": "2025-07-15T11:00:00",
+                "last_seen_date": "2025-07-16T09:00:00",
+                "deleted_date": None
+            }
+        }
+        
+        # Callers get their own copy of the cached parse
+        dates["abc-1"]["created_date"] = None
+        assert parse_app_log(str(data_dir))["abc-1"]["created_date"] == "2025-07-14T10:00:00"
+    
+    def test_v003_prepare_parses_log_into_context(self, tmp_path):
+        """Test v003 prepare() stores the app.log dates in the shared context."""
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        (tmp_path / "app.log").write_text(
+            "2025-07-14 10:00:00,123 - INFO - Saved new listing with ID abc-1 and VIN WVW12345678901234\n"
+        )
+        context = {'data_dir': str(data_dir)}
+        
+        prepare_v003(context)
+        
+        assert context['historical_dates']['abc-1']['created_date'] == "2025-07-14T10:00:00"
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pidlock module.
+Tests lock acquisition, stale lock handling, release and waiting on a lock holder.
+"""
+
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+import pidlock
+from pidlock import PidLock
+
+
+@pytest.fixture
+def lock_path():
+    """Create a temporary directory for the lock file."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir / "gti-listings.pid"
+    shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def spawn():
+    """Start helper processes running the given code and make sure they are gone afterwards."""
+    processes = []
+
+    def start(code, *args):
+        # Wait until the child is running our code so its command line is in place
+        process = subprocess.Popen([sys.executable, '-c', f"print('ready', flush=True)\n{code}", *args],
+                                   stdout=subprocess.PIPE)
+        processes.append(process)
+        process.stdout.readline()
+        return process
+
+    yield start
+
+    for process in processes:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+
+class TestAcquire:
+    """Test taking the lock in the presence of existing lock files."""
+
+    @pytest.fixture(autouse=True)
+    def fast_retries(self, monkeypatch):
+        """Keep the unreadable-lock backoff short."""
+        monkeypatch.setattr(pidlock, 'LOCK_RETRY_DELAYS', (0.01,))
+
+    def test_missing_lock_file(self, lock_path):
+        """Test the lock is taken and written with our PID when no lock file exists."""
+        lock = PidLock(str(lock_path))
+
+        assert lock.acquire() is True
+        assert lock_path.read_text() == str(lock.current_pid)
+        assert os.listdir(lock_path.parent) == [lock_path.name]
+
+    def test_stale_pid(self, lock_path, spawn):
+        """Test a lock file left by a process that has exited is replaced."""
+        exited = spawn('pass')
+        exited.wait()
+        lock_path.write_text(str(exited.pid))
+        lock = PidLock(str(lock_path))
+
+        assert lock.acquire() is True
+        assert lock_path.read_text() == str(lock.current_pid)
+
+    def test_live_process_that_is_ours(self, lock_path, spawn):
+        """Test a running GTI Listings instance keeps the lock."""
+        # The command line is what identifies our app, so pass an indicator as an argument
+        holder = spawn('import time; time.sleep(30)', 'app.py')
+        lock_path.write_text(str(holder.pid))
+        lock = PidLock(str(lock_path))
+
+        assert lock._is_our_process_running(holder.pid) is True
+        assert lock.acquire() is False
+        assert lock_path.read_text() == str(holder.pid)
+
+    def test_live_process_that_is_not_ours(self, lock_path, spawn):
+        """Test a lock file naming some other running process is left alone."""
+        other = spawn('import time; time.sleep(30)')
+        lock_path.write_text(str(other.pid))
+        lock = PidLock(str(lock_path))
+
+        assert lock._is_our_process_running(other.pid) is False
+        assert lock.acquire() is False
+        assert lock_path.read_text() == str(other.pid)
+
+    @pytest.mark.parametrize('content', ['', 'not-a-pid', '\x00\x00'])
+    def test_empty_or_garbage_lock_file(self, lock_path, content):
+        """Test an unreadable lock file is treated as held, never removed as stale."""
+        lock_path.write_text(content)
+        lock = PidLock(str(lock_path))
+
+        assert lock.acquire() is False
+        assert lock_path.read_text() == content
+
+    def test_replaced_stale_lock_is_restored(self, lock_path):
+        """Test stale cleanup puts back a fresh lock that replaced the file it checked."""
+        lock_path.write_text('999999')
+        _, stale_identity = PidLock(str(lock_path))._read_lock_file()
+
+        # Another starter cleared the stale file and took the lock in the meantime
+        lock_path.unlink()
+        lock_path.write_text('12345')
+        os.utime(lock_path, ns=(0, stale_identity[2] + 1))
+        PidLock(str(lock_path))._remove_stale_lock_file(stale_identity)
+
+        assert lock_path.read_text() == '12345'
+        assert os.listdir(lock_path.parent) == [lock_path.name]
+
+
+class TestRelease:
+    """Test releasing the lock."""
+
+    def test_release_by_owner(self, lock_path):
+        """Test the owner's release removes the lock file."""
+        lock = PidLock(str(lock_path))
+        assert lock.acquire() is True
+
+        lock.release()
+
+        assert not lock_path.exists()
+
+    def test_release_by_non_owner(self, lock_path):
+        """Test releasing a lock held by another PID leaves the file in place."""
+        lock_path.write_text('999999')
+
+        PidLock(str(lock_path)).release()
+
+        assert lock_path.read_text() == '999999'
+
+    def test_release_without_lock_file(self, lock_path):
+        """Test releasing when there is no lock file is a no-op."""
+        PidLock(str(lock_path)).release()
+
+        assert not lock_path.exists()
+
+
+class TestWaitForExisting:
+    """Test waiting for the process named in the lock file."""
+
+    @pytest.fixture(params=['pidfd', 'psutil'])
+    def lock(self, request, lock_path, monkeypatch):
+        """A PidLock using the pidfd path, or the psutil fallback used without pidfd support."""
+        lock = PidLock(str(lock_path))
+        if request.param == 'psutil':
+            pytest.importorskip('psutil')
+            monkeypatch.setattr(lock, '_open_pidfd', lambda pid: None)
+        return lock
+
+    def test_no_lock_file(self, lock):
+        """Test there is nothing to wait for without a lock file."""
+        assert lock.wait_for_existing(timeout=0.1) is True
+
+    def test_holder_exits(self, lock, lock_path, spawn):
+        """Test waiting returns once the lock holder exits."""
+        holder = spawn('import time; time.sleep(0.3)')
+        lock_path.write_text(str(holder.pid))
+
+        assert lock.wait_for_existing(timeout=10) is True
+
+    def test_holder_outlives_timeout(self, lock, lock_path, spawn):
+        """Test waiting gives up when the lock holder keeps running."""
+        holder = spawn('import time; time.sleep(30)')
+        lock_path.write_text(str(holder.pid))
+
+        assert lock.wait_for_existing(timeout=0.2) is False
+        assert holder.poll() is None
+
+    def test_lock_acquired_after_holder_exits(self, lock, lock_path, spawn):
+        """Test the lock can be taken once the holder has gone."""
+        holder = spawn('import time; time.sleep(0.3)')
+        lock_path.write_text(str(holder.pid))
+
+        assert lock.wait_for_existing(timeout=10) is True
+        holder.wait()
+        assert lock.acquire() is True
+        assert lock_path.read_text() == str(lock.current_pid)
@@ -8,7 +8,13 @@ import pytest
 import tempfile
 import shutil
 import json
+import copy
+import inspect
+import gc
+import weakref
+from operator import itemgetter
 from pathlib import Path
+import store as store_module
 from store import Store
 
 
@@ -84,6 +90,25 @@ class TestStore:
         assert listings[0]['data']['price'] == '$26,000'
         assert listings[0]['data']['title'] == 'Updated Title'
     
+    def test_concurrent_adds_same_vin_deduplicated(self, temp_store, sample_listing):
+        """Test that concurrent submissions of one VIN create a single listing."""
+        import threading
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(temp_store.add_listing(dict(sample_listing))))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(results) == 8
+        assert sum(1 for r in results if r['success']) == 1
+        assert len({r['id'] for r in results}) == 1
+        assert temp_store.get_listing_count() == 1
+    
     def test_add_duplicate_vin_no_changes(self, temp_store, sample_listing):
         """Test duplicate VIN with identical data."""
         # Add first listing
@@ -154,6 +179,53 @@ class TestStore:
         assert duplicate_result['success'] is False
         assert duplicate_result['id'] == listing_id
     
+    def test_vin_index_writes_coalesced(self, temp_store, sample_listing):
+        """Test that a burst of new listings defers VIN index writes until flushed."""
+        temp_store.add_listing(sample_listing)  # First save is immediate
+        
+        second_listing = sample_listing.copy()
+        second_listing['vin'] = 'WVWZZZ1JZ1W654321'
+        temp_store.add_listing(second_listing)
+        
+        with open(temp_store.vin_index_file, 'r') as f:
+            assert second_listing['vin'] not in json.load(f)['vin_mappings']
+        
+        temp_store.flush_vin_index()
+        
+        with open(temp_store.vin_index_file, 'r') as f:
+            assert second_listing['vin'] in json.load(f)['vin_mappings']
+    
+    def test_exit_hook_flushes_live_stores_only(self, temp_store, sample_listing):
+        """Test the shared exit hook writes deferred index changes without keeping stores alive."""
+        temp_store.add_listing(sample_listing)
+        second_listing = sample_listing.copy()
+        second_listing['vin'] = 'WVWZZZ1JZ1W654321'
+        temp_store.add_listing(second_listing)
+        
+        store_module._flush_open_stores()
+        
+        with open(temp_store.vin_index_file, 'r') as f:
+            assert second_listing['vin'] in json.load(f)['vin_mappings']
+        
+        dropped = weakref.ref(Store(data_dir=temp_store.data_dir))
+        gc.collect()
+        assert dropped() is None
+        assert temp_store in store_module._open_stores
+    
+    def test_unsaved_vin_index_entries_recovered(self, temp_store, sample_listing):
+        """Test that listings missing from an unflushed index are re-indexed on load."""
+        temp_store.add_listing(sample_listing)
+        
+        second_listing = sample_listing.copy()
+        second_listing['vin'] = 'WVWZZZ1JZ1W654321'
+        result = temp_store.add_listing(second_listing)
+        
+        # Simulate a crash: a new store loads the index without the deferred entry
+        new_store = Store(data_dir=temp_store.data_dir)
+        
+        assert new_store.vin_index[second_listing['vin']] == result['id']
+        assert new_store.add_listing(second_listing)['id'] == result['id']
+    
     def test_data_directory_creation(self):
         """Test that data directories are created if they don't exist."""
         temp_dir = tempfile.mkdtemp()
@@ -185,6 +257,132 @@ class TestStore:
         assert saved_data['data']['vin'] == sample_listing['vin']
         assert saved_data['data']['title'] == sample_listing['title']
     
+    def test_price_value_maintained(self, temp_store, sample_listing):
+        """Test that numeric price_value is stored and refreshed on price changes."""
+        result = temp_store.add_listing(sample_listing)
+        listing = temp_store.get_listing_by_id(result['id'])
+        assert listing['price_value'] == 25000
+        
+        updated_listing = sample_listing.copy()
+        updated_listing['price'] = '$23,500'
+        temp_store.add_listing(updated_listing)
+        
+        listing = temp_store.get_listing_by_id(result['id'])
+        assert listing['price_value'] == 23500
+    
+    def test_new_listing_written_at_current_schema(self, temp_store, sample_listing):
+        """Test that new listing files are stamped so they never need JIT migration."""
+        result = temp_store.add_listing(sample_listing)
+        
+        listing_file = temp_store.data_dir / f"{result['id']}.json"
+        with open(listing_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        assert data['schema_version'] == temp_store.migrator.get_current_schema_version()
+        assert data['data']['performance_package'] is None
+        assert 'performance_package' not in sample_listing  # Caller's dict is untouched
+        
+        # Updates keep the stamp
+        updated_listing = sample_listing.copy()
+        updated_listing['price'] = '$24,000'
+        temp_store.add_listing(updated_listing)
+        with open(listing_file, 'r', encoding='utf-8') as f:
+            assert json.load(f)['schema_version'] == data['schema_version']
+
+    def test_new_listing_already_has_every_migration_applied(self, temp_store, sample_listing):
+        """Test no registered migration would change a new listing that is stamped as current."""
+        result = temp_store.add_listing(sample_listing)
+        with open(temp_store.data_dir / f"{result['id']}.json", 'r', encoding='utf-8') as f:
+            created = json.load(f)
+
+        # Migrations stamp their own version; everything else must already be in place
+        schema_version = created.pop('schema_version')
+        migrator = temp_store.migrator
+        assert schema_version == migrator.get_current_schema_version()
+        assert migrator.get_available_migrations(), "no migrations found to check against"
+        for version in migrator.get_available_migrations():
+            migrate = migrator.load_migration(version).migrate
+            context = {'data_dir': temp_store.data_dir, 'historical_dates': {}}
+            args = (context,) if len(inspect.signature(migrate).parameters) > 1 else ()
+            migrated = migrate(copy.deepcopy(created), *args)
+            migrated.pop('schema_version', None)
+            # A difference means _create_new_listing must set the fields this migration adds
+            assert migrated == created, f"migration v{version:03d} changes a newly created listing"
+
+    def test_listings_cache_tracks_writes(self, temp_store, sample_listing):
+        """Test that cached listings reflect adds, comment edits and deletes."""
+        result = temp_store.add_listing(sample_listing)
+        listing_id = result['id']
+        assert len(temp_store.get_all_listings()) == 1  # Loads the cache
+        
+        # Callers get copies, so mutating a result does not leak into the cache
+        temp_store.get_all_listings()[0]['desirability_score'] = 99.0
+        assert 'desirability_score' not in temp_store.get_listing_by_id(listing_id)
+        
+        temp_store.update_comments(listing_id, 'Test drive booked')
+        assert temp_store.get_all_listings()[0]['comments'] == 'Test drive booked'
+        
+        second_listing = sample_listing.copy()
+        second_listing['vin'] = 'WVWZZZ1JZ1W654321'
+        temp_store.add_listing(second_listing)
+        assert len(temp_store.get_all_listings()) == 2
+        
+        temp_store.delete_listing(listing_id)
+        assert temp_store.get_listing_by_id(listing_id) is None
+        assert len(temp_store.get_all_listings()) == 1
+    
+    def test_iter_all_listings_is_a_snapshot(self, temp_store, sample_listing):
+        """Test that iter_all_listings yields the listings present when it was called."""
+        temp_store.add_listing(sample_listing)
+        listings = temp_store.iter_all_listings()
+        
+        second_listing = sample_listing.copy()
+        second_listing['vin'] = 'WVWZZZ1JZ1W654321'
+        temp_store.add_listing(second_listing)
+        
+        assert [listing['data']['vin'] for listing in listings] == [sample_listing['vin']]
+        assert len(list(temp_store.iter_all_listings())) == 2
+    
+    def test_invalidate_reloads_from_disk(self, temp_store, sample_listing):
+        """Test that invalidate picks up listing files edited outside the store."""
+        result = temp_store.add_listing(sample_listing)
+        temp_store.get_all_listings()
+        version = temp_store.version
+        
+        listing_file = temp_store.data_dir / f"{result['id']}.json"
+        with open(listing_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['comments'] = 'Edited by hand'
+        del data['price_value']
+        with open(listing_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        
+        temp_store.invalidate()
+        
+        assert temp_store.version > version
+        reloaded = temp_store.get_all_listings()[0]
+        assert reloaded['comments'] == 'Edited by hand'
+        assert reloaded['price_value'] == 25000  # Sort key restored on load
+
+    def test_updates_restore_price_value(self, temp_store, sample_listing):
+        """Test that comment and field updates cache listings with their sort key, even for hand-edited files."""
+        result = temp_store.add_listing(sample_listing)
+        temp_store.get_all_listings()
+
+        listing_file = temp_store.data_dir / f"{result['id']}.json"
+        for update in (lambda: temp_store.update_comments(result['id'], 'Called dealer'),
+                       lambda: temp_store.update_editable_fields(result['id'], {'performance_package': True})):
+            with open(listing_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            del data['price_value']
+            with open(listing_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+            assert update()['success']
+
+            listings = sorted(temp_store.get_all_listings(), key=itemgetter('price_value'))
+            assert listings[0]['price_value'] == 25000
+
     def test_get_listing_by_id(self, temp_store, sample_listing):
         """Test retrieving a single listing by ID."""
         # Add a listing
@@ -648,8 +846,8 @@ class TestStore:
         with open(listing_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # Remove date fields
-        for field in ['created_date', 'last_modified_date', 'last_seen_date', 'deleted_date']:
+        # Remove date fields (and the version stamp - old-format files predate versioning)
+        for field in ['schema_version', 'created_date', 'last_modified_date', 'last_seen_date', 'deleted_date']:
             if field in data:
                 del data[field]
         
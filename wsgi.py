@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for serving GTI Listings with a production server.
+
+Run with the bundled Gunicorn config (single worker, threaded):
+    gunicorn -c gunicorn_conf.py wsgi:application
+
+Store keeps the VIN index in process memory, so multiple worker processes
+would each hold their own copy and could create duplicate listings.
+"""
+
+from app import app as application